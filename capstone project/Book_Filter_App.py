@@ -1,5 +1,8 @@
-import pandas as pd
-import numpy as np
+import time
+
+# Measured as early as possible so the startup time includes the imports below
+STARTUP_START = time.perf_counter()
+
 from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, messagebox
@@ -7,58 +10,383 @@ from tkinter.scrolledtext import ScrolledText
 import logging
 import traceback
 import random
+import argparse
+import cProfile
+import os
+import threading
+import bisect
+import re
+from contextlib import contextmanager
+
+# pandas, numpy and book_snapshot are imported lazily (in the functions that use them)
+# so that the window can be shown before the heavy modules are loaded
 
 # Set up logging configuration
 logging.basicConfig(filename='book_filter_app.log', 
                    level=logging.ERROR,
                    format='%(asctime)s:%(levelname)s:%(message)s')
 
+# Profiling mode (opt-in): slow operations are logged as warnings
+PROFILE_ENABLED = os.environ.get('BOOK_APP_PROFILE', '') == '1'
+SLOW_OPERATION_MS = float(os.environ.get('BOOK_APP_SLOW_MS', '200'))
+
+# How often the window checks whether the background data loading has finished
+LOAD_POLL_MS = 50
+
+# Hot reload: the data files are checked for changes every RELOAD_POLL_MS
+DATA_FILE = 'scraped_books.csv'
+RELOAD_POLL_MS = 2000
+
+# --sqlite: the match counts are queried once the filters have not changed for FACET_DEBOUNCE_MS
+FACET_DEBOUNCE_MS = 150
+
+# Number of books shown by "More Like This"
+SIMILAR_BOOKS = 10
+
+# Default database of --sqlite (book_store.DATABASE_FILE, not imported at startup)
+DATABASE_FILE = 'books.db'
+
+# --cprofile: one profile per worker thread (cProfile only sees the thread that enabled it),
+# merged into the dump of the main thread when the application closes
+thread_profiles = None
+
+def filter_books(df, genre='All', min_price=None, max_price=None, min_rating=None, sort_by=None):
+    """Return the books matching the given filters, optionally sorted"""
+    import numpy as np
+    
+    mask = np.ones(len(df), dtype=bool)
+    
+    # Apply genre filter
+    if genre and genre != 'All':
+        mask &= (df['genre'] == genre).to_numpy()
+    
+    # Apply price filter
+    if min_price is not None:
+        mask &= (df['price'] >= min_price).to_numpy()
+    if max_price is not None:
+        mask &= (df['price'] <= max_price).to_numpy()
+    
+    # Apply rating filter
+    if min_rating is not None:
+        mask &= (df['rating_numeric'] >= min_rating).to_numpy()
+    
+    filtered_df = df[mask]
+    
+    # Apply sorting
+    if sort_by:
+        filtered_df = filtered_df.sort_values(by=sort_by, ascending=False)
+    
+    return filtered_df
+
+def strip_count(text):
+    """Remove the ' (n)' match count shown after the values in the filter dropdowns"""
+    return re.sub(r' \(\d+\)$', '', text.strip())
+
+def moved_row(row, changes):
+    """Return the new snapshot row of a book after a reload, or None if it was removed"""
+    return moved_rows([row], changes)[0]
+
+def moved_rows(rows, changes):
+    """Return the new snapshot rows of several books after a reload (None for the removed ones)
+    
+    changes is the change record of the new snapshot (None: the rows of the old version are unknown).
+    """
+    if changes is None:
+        return [None] * len(rows)
+    # The books keep their row unless they were removed or moved into the hole of a removed book
+    deleted = set(changes['deleted'])
+    moved = {old: new for old, new in changes['moved']}
+    return [moved.get(row, None if row in deleted else row) for row in rows]
+
+def sample_book(df, genre='All'):
+    """Return a random book from the given genre, or None if the genre is empty"""
+    if genre != 'All':
+        df = df[df['genre'] == genre]
+    if df.empty:
+        return None
+    return df.sample(n=1).iloc[0]
+
+def run_profiled(target):
+    """Run a worker thread function, under its own profiler when --cprofile is on"""
+    if thread_profiles is None:
+        target()
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        target()
+    finally:
+        profiler.disable()
+        thread_profiles.append(profiler)
+
+def start_worker(target):
+    """Run a function in a background thread (the window keeps responding)"""
+    threading.Thread(target=run_profiled, args=(target,), daemon=True).start()
+
 class BookFilterApp:
-    def __init__(self, root):
+    def __init__(self, root, profile=PROFILE_ENABLED, slow_ms=SLOW_OPERATION_MS,
+                 use_snapshot=True, report_startup=False, database=None):
         """Initialize the application"""
         try:
+            self.profile = profile
+            self.slow_ms = slow_ms
+            if self.profile:
+                logging.getLogger().setLevel(logging.INFO)
+            self.use_snapshot = use_snapshot
+            self.report_startup = report_startup
+            # With a database the filters are run as SQL queries, one page of results at a time
+            self.database = database
+            self.conn = None
+            self.query_filters = {}
+            self.query_sort = None
+            # Without a database the pages are taken from the filtered (and sorted) books in memory
+            self.filtered_books = None
+            self.page_offset = 0
+            self.page_total = 0
+            # The match counts are queried in a worker thread, with its own connection
+            self.facet_conn = None
+            self.facet_after = None
+            self.facets_running = False
+            self.facets_stale = False
+            self.facet_result = None
+            self.genre_cache = None
+            
             self.root = root
             self.root.title("Book Filter Application")
             self.root.geometry("1000x800")
             
-            # Load the data
-            self.df = self.load_and_clean_data()
+            # Show the window shell straight away, then load the data in the background
+            # Snapshot on screen and its frame, always replaced together in one assignment so that a
+            # worker thread reading them never sees the frame of one version with the snapshot of another
+            self.data = (None, None)
+            self.data_source = None
+            self.load_finished = False
+            self.showing_filter_results = False
+            self.selected_row = None
+            # "More Like This" index and the snapshot it was built for, built in a worker thread
+            self.similarity = None
+            self.similarity_building = False
+            self.similar_waiting = False
+            self.result_rows = []
+            self.result_lines = []
+            self.result_covers = []
+            self.shown_covers = {}
+            self.cover_cache = None
+            self.covers_pending = False
+            self.reload_running = False
+            self.reload_result = None
+            self.loading_label = ttk.Label(self.root, text="Loading books...", padding="20")
+            self.loading_label.pack()
+            self.root.update_idletasks()
+            self.window_shown_ms = (time.perf_counter() - STARTUP_START) * 1000
             
-            if self.df is not None:
+            start_worker(self.load_data_in_background)
+            self.root.after(LOAD_POLL_MS, self.finish_startup)
+        except Exception as e:
+            self.log_error("Initialization error", e)
+            self.display_error("Application failed to start properly.")
+
+    def load_data_in_background(self):
+        """Load the data without blocking the window (runs in a worker thread)"""
+        try:
+            with self.profile_operation('load') as stats:
+                if self.database:
+                    import book_store
+                    
+                    # Only used by the main thread once the loading has finished
+                    conn = book_store.connect(self.database, check_same_thread=False)
+                    stats['rows_out'] = book_store.count_books(conn)
+                    self.db_version = book_store.data_version(conn)
+                    self.conn, self.data_source = conn, 'sqlite'
+                    return
+                self.file_times = self.data_file_times()
+                snapshot, self.data_source = self.load_data()
+                df = None if snapshot is None else snapshot.frame()
+                self.data = (snapshot, df)
+                stats['source'] = self.data_source
+                stats['rows_out'] = 0 if df is None else len(df)
+        except Exception as e:
+            self.log_error("Data loading error", e)
+        finally:
+            self.load_finished = True
+
+    def finish_startup(self):
+        """Build the interface once the background loading has finished"""
+        if not self.load_finished:
+            self.root.after(LOAD_POLL_MS, self.finish_startup)
+            return
+        try:
+            self.loading_label.destroy()
+            if self.data[1] is not None or self.conn is not None:
                 self.create_widgets()
+                self.root.after(RELOAD_POLL_MS, self.check_for_updates)
             else:
                 self.display_error("Failed to load data. Please check the data file.")
+            self.log_startup_time()
         except Exception as e:
             self.log_error("Initialization error", e)
             self.display_error("Application failed to start properly.")
 
-    def load_and_clean_data(self):
-        """Load and clean the book data"""
+    def log_startup_time(self):
+        """Record how long it took to show the window and to get the data ready"""
+        ready_ms = (time.perf_counter() - STARTUP_START) * 1000
+        message = (f"Startup: window shown after {self.window_shown_ms:.0f} ms, "
+                   f"data ready after {ready_ms:.0f} ms (source: {self.data_source})")
+        logging.info(message)
+        if self.report_startup:
+            print(message)
+
+    def load_data(self, csv_file=DATA_FILE):
+        """Open the snapshot if it is up to date, otherwise read the CSV file into memory
+        
+        Returns the snapshot (None if the data could not be loaded) and where it came from.
+        """
+        from book_snapshot import BookSnapshot, SNAPSHOT_FILE
+        
+        # The snapshot (written by data processing.py) is memory-mapped read-only: numeric columns
+        # are used in place and the text columns are only decoded for the books that are displayed
+        if self.use_snapshot and self.snapshot_is_fresh(csv_file):
+            try:
+                return BookSnapshot(SNAPSHOT_FILE), 'snapshot'
+            except Exception as e:
+                self.log_error("Snapshot loading error", e)
+        
+        # The application never writes the snapshot: this copy of the data is private to this instance
+        df = self.load_and_clean_data(csv_file)
+        if df is None:
+            return None, 'csv'
+        return BookSnapshot.from_frame(df), 'csv'
+
+    def snapshot_is_fresh(self, csv_file=DATA_FILE):
+        """Return True if the snapshot was built from the current version of the CSV file"""
+        from book_snapshot import SNAPSHOT_FILE, snapshot_is_fresh
+        
+        return snapshot_is_fresh(SNAPSHOT_FILE, csv_file)
+
+    def data_file_times(self):
+        """Return the modification times of the files the data is loaded from"""
+        from book_snapshot import SNAPSHOT_FILE
+        
+        return {name: os.path.getmtime(name) for name in (DATA_FILE, SNAPSHOT_FILE) if os.path.exists(name)}
+
+    def check_for_updates(self):
+        """Start a background reload when the data files have changed since they were loaded"""
         try:
-            # Attempt to read the CSV file
-            df = pd.read_csv('scraped_books.csv')
-            
-            # Clean price data
-            df['price'] = pd.to_numeric(df['price'].str.replace('£', ''), errors='coerce')
-            
-            # Map ratings to numeric values
-            rating_map = {'One': 1, 'Two': 2, 'Three': 3, 'Four': 4, 'Five': 5}
-            df['rating_numeric'] = df['rating'].map(rating_map)
-            
-            # Clean genre data
-            df['genre'] = df['genre'].fillna('Unknown').astype('category')
-            
-            # Create popularity metric if not exists
-            if 'popularity' not in df.columns:
-                df['popularity'] = df['rating_numeric'] * 2
-            
-            # Remove any rows with NaN values
-            df = df.dropna(subset=['price', 'rating_numeric', 'genre'])
+            if self.conn is not None:
+                self.check_database_updates()
+            elif not self.reload_running and self.data_file_times() != self.file_times:
+                self.reload_running = True
+                start_worker(self.reload_in_background)
+                self.root.after(LOAD_POLL_MS, self.finish_reload)
+        except Exception as e:
+            self.log_error("Update check error", e)
+        self.root.after(RELOAD_POLL_MS, self.check_for_updates)
+
+    def reload_in_background(self):
+        """Map the new version of the data (runs in a worker thread)"""
+        result = None
+        try:
+            with self.profile_operation('reload') as stats:
+                file_times = self.data_file_times()
+                # A new CSV is picked up once data processing.py has written its snapshot: reading it
+                # here too would make every running instance parse the whole file
+                if self.data_source == 'snapshot' and not self.snapshot_is_fresh():
+                    stats['waiting_for'] = 'snapshot'
+                    return
+                snapshot, source = self.load_data()
+                if snapshot is not None:
+                    from book_facets import FacetCounter
+                    
+                    # The new frame is used as it is (a view of the mapped snapshot, shared with the other
+                    # instances). data processing.py kept the rows of the previous snapshot and listed the
+                    # rows that changed, so the filter codes are only recomputed for those (in finish_reload);
+                    # without a change record from the snapshot on screen everything is rebuilt here
+                    df = snapshot.frame()
+                    changes = snapshot.changes_since(self.data[0])
+                    facets = None
+                    if changes is None:
+                        facets = FacetCounter(df)
+                    else:
+                        stats.update({key: len(changes[key]) for key in ('inserted', 'updated', 'deleted')})
+                    result = (snapshot, source, df, changes, facets, file_times)
+                stats['rows_out'] = 0 if result is None else len(result[2])
+        except Exception as e:
+            self.log_error("Data reload error", e)
+        finally:
+            self.reload_result = result
+            self.reload_running = False
+
+    def finish_reload(self):
+        """Swap in the reloaded data and refresh the current view in place"""
+        if self.reload_running:
+            self.root.after(LOAD_POLL_MS, self.finish_reload)
+            return
+        result, self.reload_result = self.reload_result, None
+        if result is None:
+            # Keep the current data; try again on the next change
+            self.file_times = self.data_file_times()
+            return
+        try:
+            snapshot, source, df, changes, facets, file_times = result
+            with self.profile_operation('patch', rows=0 if changes is None else len(changes['rows'])):
+                index = self.similarity_index()
+                if changes is None:
+                    self.facets = facets
+                else:
+                    # Only the changed rows are recomputed (the other books kept their row)
+                    self.facets.patch(df, changes)
+                    if index is not None:
+                        index.patch(df, snapshot.column('title').take(changes['rows']), changes)
+                self.data, self.data_source, self.file_times = (snapshot, df), source, file_times
+            self.update_facet_counts()
             
-            return df
+            if index is not None and changes is not None:
+                self.similarity = (snapshot, index)
+            elif self.similarity is not None:
+                # The similarity features of the old version no longer match: rebuild them in the background
+                self.start_similarity_build()
+            if self.selected_row is not None:
+                self.selected_row = moved_row(self.selected_row, changes)
+            # The books on screen keep pointing at the same books (None once removed)
+            self.result_rows = moved_rows(self.result_rows, changes)
+            if changes is None:
+                self.status_var.set(f"Catalogue reloaded: {len(df)} books")
+            else:
+                self.status_var.set(f"Catalogue updated: {len(changes['inserted'])} new, "
+                                    f"{len(changes['updated'])} changed, {len(changes['deleted'])} removed")
+            if self.showing_filter_results:
+                self.apply_filters()
+        except Exception as e:
+            self.log_error("Data reload error", e)
+            self.display_error("Error refreshing the book data.")
+
+    def check_database_updates(self):
+        """Refresh the counts and the current page when another program has written to the database"""
+        import book_store
+        
+        version = book_store.data_version(self.conn)
+        if version == self.db_version:
+            return
+        self.db_version = version
+        # The cleaned table is rewritten as a whole, so the row ids of the old version are gone
+        self.selected_row = None
+        self.result_rows = [None] * len(self.result_rows)
+        self.update_filter_options()
+        self.status_var.set(f"Catalogue updated: {book_store.count_books(self.conn)} books")
+        if self.showing_filter_results:
+            self.show_page(self.page_offset)
+
+    def load_and_clean_data(self, csv_file='scraped_books.csv'):
+        """Load and clean the book data"""
+        import pandas as pd
+        from book_snapshot import clean_books
+        
+        try:
+            # Attempt to read the CSV file; the cleaning is shared with the snapshot of data processing.py
+            return clean_books(pd.read_csv(csv_file))
             
         except FileNotFoundError:
-            self.log_error("Data file not found", "scraped_books.csv is missing")
+            self.log_error("Data file not found", f"{csv_file} is missing")
             return None
         except Exception as e:
             self.log_error("Data loading error", e)
@@ -89,9 +417,16 @@ class BookFilterApp:
             # Setup Buttons
             self.setup_buttons()
             
+            # Setup live match counts next to the filters
+            self.setup_facet_counts()
+            
             # Setup Results Area
             self.setup_results_area()
             
+            # Setup Status Bar
+            self.status_var = tk.StringVar()
+            ttk.Label(self.root, textvariable=self.status_var, padding="5").pack(fill="x", padx=10)
+            
             # Display initial results
             self.display_all_books()
             
@@ -103,11 +438,123 @@ class BookFilterApp:
         """Setup the genre filter dropdown"""
         ttk.Label(self.filter_frame, text="Genre:").grid(row=0, column=0, padx=5, pady=5)
         self.genre_var = tk.StringVar()
-        genres = ['All'] + sorted(list(self.df['genre'].unique()))
-        self.genre_combo = ttk.Combobox(self.filter_frame, textvariable=self.genre_var, values=genres)
+        self.genre_combo = ttk.Combobox(self.filter_frame, textvariable=self.genre_var)
         self.genre_combo.set('All')
         self.genre_combo.grid(row=0, column=1, padx=5, pady=5)
 
+    def setup_facet_counts(self):
+        """Setup the match counts that follow every change of the filters"""
+        self.facet_var = tk.StringVar()
+        ttk.Label(self.filter_frame, textvariable=self.facet_var).grid(row=3, column=0, columnspan=5,
+                                                                       sticky="w", padx=5, pady=5)
+        self.update_filter_options()
+        for var in (self.genre_var, self.price_min_var, self.price_max_var, self.rating_var):
+            var.trace_add('write', self.update_facet_counts)
+
+    def update_filter_options(self):
+        """Precompute the filter codes of the current data and show the counts"""
+        from book_facets import FacetCounter
+        
+        # With a database the counts are queried on every change instead
+        if self.conn is None:
+            self.facets = FacetCounter(self.data[1])
+        self.update_facet_counts()
+
+    def update_facet_counts(self, *args):
+        """Show how many books each genre, rating and price range would return with the other filters"""
+        try:
+            if self.conn is not None:
+                # The queries scan the table: wait until the user stops typing, then run them in the background
+                if self.facet_after is not None:
+                    self.root.after_cancel(self.facet_after)
+                self.facet_after = self.root.after(FACET_DEBOUNCE_MS, self.start_facet_counts)
+                return
+            genre, min_price, max_price, rating = self.current_filter_values()
+            with self.profile_operation('facets', genre=genre, min_price=min_price,
+                                        max_price=max_price, min_rating=rating) as stats:
+                counts = self.facets.counts(genre, min_price, max_price, rating)
+                stats['rows_in'] = len(self.data[1])
+                stats['rows_out'] = counts['total']
+            self.show_facet_counts(counts)
+        except Exception as e:
+            self.log_error("Facet count error", e)
+
+    def start_facet_counts(self):
+        """Query the match counts of the current filters in a worker thread (one query at a time)"""
+        self.facet_after = None
+        if self.facets_running:
+            # Counted again with the latest filters when the running query finishes
+            self.facets_stale = True
+            return
+        self.facets_running = True
+        filters = self.current_filter_values()
+        start_worker(lambda: self.count_facets_in_background(filters))
+        self.root.after(LOAD_POLL_MS, self.finish_facet_counts)
+
+    def count_facets_in_background(self, filters):
+        """Query the match counts from the database (runs in a worker thread)"""
+        try:
+            import book_store
+            
+            genre, min_price, max_price, rating = filters
+            with self.profile_operation('facets', genre=genre, min_price=min_price,
+                                        max_price=max_price, min_rating=rating) as stats:
+                if self.facet_conn is None:
+                    # Only used by the facet worker, which never runs twice at the same time
+                    self.facet_conn = book_store.connect(self.database, check_same_thread=False)
+                # The genres only change when the data does
+                version = book_store.data_version(self.facet_conn)
+                if self.genre_cache is None or self.genre_cache[0] != version:
+                    self.genre_cache = (version, book_store.genre_names(self.facet_conn))
+                counts = book_store.facet_counts(self.facet_conn, genre, min_price, max_price, rating,
+                                                 genres=self.genre_cache[1])
+                stats['rows_out'] = counts['total']
+            self.facet_result = counts
+        except Exception as e:
+            self.facet_result = None
+            self.log_error("Facet count error", e)
+        finally:
+            self.facets_running = False
+
+    def finish_facet_counts(self):
+        """Show the match counts once the worker thread has queried them"""
+        if self.facets_running:
+            self.root.after(LOAD_POLL_MS, self.finish_facet_counts)
+            return
+        counts, self.facet_result = self.facet_result, None
+        if self.facets_stale:
+            self.facets_stale = False
+            self.start_facet_counts()
+            return
+        if counts is not None:
+            try:
+                self.show_facet_counts(counts)
+            except Exception as e:
+                self.log_error("Facet count error", e)
+
+    def show_facet_counts(self, counts):
+        """Show the match counts next to the filters"""
+        self.genre_combo['values'] = ['All'] + [f"{name} ({count})" for name, count
+                                                in sorted(counts['genre'].items())]
+        self.rating_combo['values'] = [f"{value} ({count})" for value, count in counts['rating'].items()]
+        price_counts = "   ".join(f"{label}: {count}" for label, count in counts['price'].items())
+        self.facet_var.set(f"Matching books: {counts['total']}   |   Price ranges: {price_counts}")
+
+    def selected_genre(self):
+        """Return the selected genre without its match count"""
+        return strip_count(self.genre_var.get()) or 'All'
+
+    def current_filter_values(self):
+        """Return the filters as typed so far; values that are not valid (yet) are ignored"""
+        values = []
+        for text in (self.price_min_var.get(), self.price_max_var.get(), strip_count(self.rating_var.get())):
+            try:
+                values.append(float(text) if text else None)
+            except ValueError:
+                values.append(None)
+        min_price, max_price, rating = values
+        return self.selected_genre(), min_price, max_price, rating
+
     def setup_price_filter(self):
         """Setup the price range filter"""
         ttk.Label(self.filter_frame, text="Price Range (£):").grid(row=0, column=2, padx=5, pady=5)
@@ -147,28 +594,37 @@ class BookFilterApp:
         self.suggest_button = ttk.Button(self.filter_frame, text="Suggest Random Book", 
                                         command=self.suggest_random_book)
         self.suggest_button.grid(row=2, column=0, columnspan=2, padx=5, pady=5)
+        
+        self.similar_button = ttk.Button(self.filter_frame, text="More Like This", 
+                                        command=self.show_similar_books)
+        self.similar_button.grid(row=2, column=2, padx=5, pady=5)
+        
+        # The results are shown one page at a time
+        page_frame = ttk.Frame(self.filter_frame)
+        page_frame.grid(row=2, column=3, padx=5, pady=5)
+        ttk.Button(page_frame, text="< Previous", command=self.previous_page).pack(side="left")
+        ttk.Button(page_frame, text="Next >", command=self.next_page).pack(side="left")
 
     def setup_results_area(self):
         """Setup the results display area"""
         self.results_text = ScrolledText(self.results_frame, height=20)
         self.results_text.pack(fill="both", expand=True)
+        # Clicking on a book selects it for "More Like This"
+        self.results_text.bind('<ButtonRelease-1>', self.on_results_click)
+        # The cover thumbnails are only loaded for the books that are scrolled into view
+        self.results_text.configure(yscrollcommand=self.on_results_scroll)
 
     def apply_filters(self):
         """Apply selected filters to the data"""
         try:
-            filtered_df = self.df.copy()
+            min_price = max_price = rating = None
             
-            # Apply genre filter
-            if self.genre_var.get() != 'All':
-                filtered_df = filtered_df[filtered_df['genre'] == self.genre_var.get()]
-            
-            # Apply price filter
+            # Validate price filter
             if self.price_min_var.get():
                 try:
                     min_price = float(self.price_min_var.get())
                     if min_price < 0:
                         raise ValueError("Minimum price cannot be negative")
-                    filtered_df = filtered_df[filtered_df['price'] >= min_price]
                 except ValueError as ve:
                     self.display_error("Invalid minimum price. Please enter a positive number.")
                     return
@@ -178,27 +634,42 @@ class BookFilterApp:
                     max_price = float(self.price_max_var.get())
                     if max_price < 0:
                         raise ValueError("Maximum price cannot be negative")
-                    filtered_df = filtered_df[filtered_df['price'] <= max_price]
                 except ValueError as ve:
                     self.display_error("Invalid maximum price. Please enter a positive number.")
                     return
             
-            # Apply rating filter
+            # Validate rating filter
             if self.rating_var.get():
                 try:
-                    rating = int(self.rating_var.get())
+                    rating = int(strip_count(self.rating_var.get()))
                     if rating not in [1, 2, 3, 4, 5]:
                         raise ValueError("Invalid rating value")
-                    filtered_df = filtered_df[filtered_df['rating_numeric'] >= rating]
                 except ValueError:
                     self.display_error("Please select a valid rating (1-5).")
                     return
             
+            params = {'genre': self.selected_genre(), 'min_price': min_price,
+                      'max_price': max_price, 'min_rating': rating}
+            if self.conn is not None:
+                self.query_filters = params
+                self.query_sort = self.sort_var.get() or None
+                self.show_page(0)
+                return
+            
+            df = self.data[1]
+            with self.profile_operation('filter', **params) as stats:
+                filtered_df = filter_books(df, **params)
+                stats['rows_in'] = len(df)
+                stats['rows_out'] = len(filtered_df)
+            
             # Apply sorting
             if self.sort_var.get():
-                filtered_df = filtered_df.sort_values(by=self.sort_var.get(), ascending=False)
+                with self.profile_operation('sort', sort_by=self.sort_var.get(), **params) as stats:
+                    filtered_df = filtered_df.sort_values(by=self.sort_var.get(), ascending=False)
+                    stats['rows_in'] = len(filtered_df)
             
-            self.display_results(filtered_df)
+            self.filtered_books = filtered_df
+            self.show_page(0)
             
         except Exception as e:
             self.log_error("Filter application error", e)
@@ -217,63 +688,306 @@ class BookFilterApp:
             self.log_error("Reset error", e)
             self.display_error("Error resetting filters.")
 
-    def display_results(self, df):
-        """Display filtered results"""
+    def show_page(self, offset):
+        """Display one page of the filtered books, queried from the database or taken from memory"""
+        import book_store
+        
+        if self.conn is None:
+            # Only the books of the page are rendered, however many matched
+            self.page_offset = offset
+            self.page_total = len(self.filtered_books)
+            self.display_results(self.filtered_books.iloc[offset:offset + book_store.PAGE_SIZE],
+                                 self.page_total, offset)
+            return
         try:
-            self.results_text.delete(1.0, tk.END)
-            
-            if df.empty:
-                self.results_text.insert(tk.END, "No books found matching the filters.")
+            with self.profile_operation('query', offset=offset, sort_by=self.query_sort,
+                                        **self.query_filters) as stats:
+                total = book_store.count_books(self.conn, **self.query_filters)
+                page = book_store.query_books(self.conn, **self.query_filters, sort_by=self.query_sort,
+                                              limit=book_store.PAGE_SIZE, offset=offset)
+                stats['rows_out'] = len(page)
+            self.page_offset = offset
+            self.page_total = total
+            self.display_results(page, total, offset)
+        except Exception as e:
+            self.log_error("Database query error", e)
+            self.display_error("Error querying the book database.")
+
+    def previous_page(self):
+        """Show the previous page of results"""
+        if self.showing_filter_results and self.page_offset > 0:
+            import book_store
+            self.show_page(max(self.page_offset - book_store.PAGE_SIZE, 0))
+
+    def next_page(self):
+        """Show the next page of results"""
+        import book_store
+        
+        if self.showing_filter_results and self.page_offset + book_store.PAGE_SIZE < self.page_total:
+            self.show_page(self.page_offset + book_store.PAGE_SIZE)
+
+    def display_results(self, df, total=None, offset=0):
+        """Display filtered results (df may be one page of total results, starting at offset)"""
+        try:
+            with self.profile_operation('render') as stats:
+                stats['rows_in'] = len(df)
+                self.showing_filter_results = True
+                self.clear_results()
+                
+                if df.empty:
+                    self.results_text.insert(tk.END, "No books found matching the filters.")
+                    return
+                
+                if total is None or total == len(df):
+                    self.results_text.insert(tk.END, f"Found {len(df)} books matching the criteria:\n\n")
+                else:
+                    self.results_text.insert(tk.END, f"Found {total} books matching the criteria "
+                                                     f"(showing {offset + 1}-{offset + len(df)}):\n\n")
+                
+                for row, book in df.iterrows():
+                    self.insert_book(row, book, "\n")
+        except Exception as e:
+            self.log_error("Display error", e)
+            self.display_error("Error displaying results.")
+
+    def book_text(self, row, name, book=None):
+        """Return a text field of a book: decoded from the snapshot, or read from the database row"""
+        snapshot = self.data[0]
+        if snapshot is not None:
+            return snapshot.text(name, row)
+        if book is None:
+            import book_store
+            book = book_store.get_book(self.conn, row)
+        return book[name]
+
+    def format_book(self, row, book, similarity=None):
+        """Format the details of one book"""
+        return (
+            f"Title: {self.book_text(row, 'title', book)}\n"
+            f"Author: {self.book_text(row, 'author', book)}\n"
+            f"Genre: {book['genre']}\n"
+            f"Price: £{book['price']:.2f}\n"
+            f"Rating: {self.book_text(row, 'rating', book)}\n"
+            f"Popularity: {book['popularity']:.1f}\n"
+            + (f"Similarity: {similarity:.2f}\n" if similarity is not None else "")
+            + f"{'-'*50}\n"
+        )
+
+    def clear_results(self):
+        """Empty the results area"""
+        self.results_text.delete(1.0, tk.END)
+        self.result_rows = []
+        self.result_lines = []
+        self.result_covers = []
+        self.shown_covers = {}
+
+    def insert_book(self, row, book, end="", similarity=None):
+        """Add one book to the results area and remember on which line it starts"""
+        self.result_lines.append(int(self.results_text.index('end-1c').split('.')[0]))
+        self.result_rows.append(row)
+        self.result_covers.append(self.book_cover(row, book))
+        self.results_text.insert(tk.END, self.format_book(row, book, similarity) + end)
+
+    def book_cover(self, row, book):
+        """Return the hash of the cover of a book, or None (older data files have no covers)"""
+        try:
+            cover = self.book_text(row, 'cover', book)
+        except KeyError:
+            return None
+        return cover if isinstance(cover, str) and cover else None
+
+    def on_results_scroll(self, first, last):
+        """Move the scrollbar and show the covers of the books that came into view"""
+        self.results_text.vbar.set(first, last)
+        if not self.covers_pending:
+            self.covers_pending = True
+            self.root.after_idle(self.show_visible_covers)
+
+    def show_visible_covers(self):
+        """Put the cover thumbnails in front of the books currently visible in the results area"""
+        self.covers_pending = False
+        try:
+            if self.cover_cache is None:
+                from book_covers import CoverCache
+                self.cover_cache = CoverCache()
+            top = int(self.results_text.index('@0,0').split('.')[0])
+            bottom = int(self.results_text.index(f"@0,{self.results_text.winfo_height()}").split('.')[0])
+            # The books starting above the top line are visible too if they run into the view
+            first = max(bisect.bisect_right(self.result_lines, top) - 1, 0)
+            last = bisect.bisect_right(self.result_lines, bottom)
+            for i in range(first, last):
+                if self.result_covers[i] is None:
+                    continue
+                image = self.cover_cache.get(self.result_covers[i])
+                line = self.result_lines[i]
+                # A thumbnail dropped by the cache shows as blank space until its book is visible again
+                if image is None or self.shown_covers.get(line) == str(image):
+                    continue
+                if line in self.shown_covers:
+                    self.results_text.image_configure(f"{line}.0", image=image)
+                else:
+                    self.results_text.image_create(f"{line}.0", image=image, padx=5)
+                self.shown_covers[line] = str(image)
+        except Exception as e:
+            self.log_error("Cover display error", e)
+
+    def on_results_click(self, event):
+        """Select the book that was clicked in the results area"""
+        try:
+            line = int(self.results_text.index(f"@{event.x},{event.y}").split('.')[0])
+            i = bisect.bisect_right(self.result_lines, line) - 1
+            if 0 <= i < len(self.result_rows):
+                if self.result_rows[i] is None:
+                    self.status_var.set("This book is no longer in the catalogue.")
+                else:
+                    self.select_book(self.result_rows[i])
+        except Exception as e:
+            self.log_error("Selection error", e)
+
+    def select_book(self, row):
+        """Remember the book used by the More Like This button"""
+        self.selected_row = row
+        self.status_var.set(f"Selected: {self.book_text(row, 'title')}")
+
+    def show_similar_books(self):
+        """Show the books most similar to the selected book"""
+        try:
+            if self.selected_row is None:
+                self.display_error("Please select a book first: click on it in the results "
+                                   "or use Suggest Random Book.")
+                return
+            if self.conn is not None:
+                self.display_error("More Like This needs the catalogue in memory: "
+                                   "start the application without --sqlite.")
                 return
             
-            self.results_text.insert(tk.END, f"Found {len(df)} books matching the criteria:\n\n")
+            # The feature matrix is built once per version of the data, without blocking the window
+            if self.similarity_index() is None:
+                self.start_similarity_build()
+                self.status_var.set("Preparing More Like This...")
+                if not self.similar_waiting:
+                    self.similar_waiting = True
+                    self.root.after(LOAD_POLL_MS, self.finish_similar_books)
+                return
+            self.display_similar_books()
+        except Exception as e:
+            self.log_error("Similar books error", e)
+            self.display_error("Error finding similar books.")
+
+    def similarity_index(self):
+        """Return the similarity index of the current data, or None if it is not built (yet)"""
+        if self.similarity is None or self.similarity[0] is not self.data[0]:
+            return None
+        return self.similarity[1]
+
+    def start_similarity_build(self):
+        """Start building the similarity index in a worker thread (once at a time)"""
+        if not self.similarity_building:
+            self.similarity_building = True
+            start_worker(self.build_similarity_index)
+
+    def build_similarity_index(self):
+        """Build the similarity index of the current data (runs in a worker thread)"""
+        try:
+            from book_similarity import BookSimilarityIndex
             
-            for _, book in df.iterrows():
-                self.results_text.insert(tk.END,
-                    f"Title: {book['title']}\n"
-                    f"Author: {book['author']}\n"
-                    f"Genre: {book['genre']}\n"
-                    f"Price: £{book['price']:.2f}\n"
-                    f"Rating: {book['rating']}\n"
-                    f"Popularity: {book['popularity']:.1f}\n"
-                    f"{'-'*50}\n\n"
-                )
+            # A reload during the build makes it out of date: build again for the new data
+            while self.similarity_index() is None:
+                snapshot, df = self.data
+                with self.profile_operation('similarity_build') as stats:
+                    titles = snapshot.column('title').take(df.index)
+                    self.similarity = (snapshot, BookSimilarityIndex(df, titles))
+                    stats['rows_in'] = len(df)
         except Exception as e:
-            self.log_error("Display error", e)
-            self.display_error("Error displaying results.")
+            self.log_error("Similarity index error", e)
+        finally:
+            self.similarity_building = False
+
+    def finish_similar_books(self):
+        """Show the similar books once the similarity index is ready"""
+        if self.similarity_building:
+            self.root.after(LOAD_POLL_MS, self.finish_similar_books)
+            return
+        self.similar_waiting = False
+        try:
+            if self.similarity_index() is None:
+                self.status_var.set("")
+                self.display_error("Error finding similar books.")
+            elif self.selected_row is None:
+                self.status_var.set("The selected book is no longer in the catalogue.")
+            else:
+                self.select_book(self.selected_row)
+                self.display_similar_books()
+        except Exception as e:
+            self.log_error("Similar books error", e)
+            self.display_error("Error finding similar books.")
+
+    def display_similar_books(self):
+        """Show the books most similar to the selected book, using the similarity index"""
+        snapshot, df = self.data
+        with self.profile_operation('similar', row=self.selected_row) as stats:
+            rows, scores = self.similarity_index().most_similar(self.selected_row, SIMILAR_BOOKS)
+            stats['rows_in'] = len(df)
+            stats['rows_out'] = len(rows)
+        
+        self.showing_filter_results = False
+        self.clear_results()
+        self.results_text.insert(tk.END, f"Books similar to {snapshot.text('title', self.selected_row)}:\n\n")
+        for row, score in zip(rows, scores):
+            self.insert_book(row, df.loc[row], "\n", similarity=score)
 
     def display_all_books(self):
         """Display all books without filters"""
-        self.display_results(self.df)
+        if self.conn is not None:
+            self.query_filters = {}
+            self.query_sort = None
+        else:
+            self.filtered_books = self.data[1]
+        self.show_page(0)
 
     def suggest_random_book(self):
         """Suggest a random book from the selected genre"""
         try:
-            genre = self.genre_var.get()
-            if genre == 'All':
-                book = self.df.sample(n=1).iloc[0]
-            else:
-                genre_df = self.df[self.df['genre'] == genre]
-                if genre_df.empty:
-                    self.display_error(f"No books found in the {genre} genre.")
-                    return
-                book = genre_df.sample(n=1).iloc[0]
+            genre = self.selected_genre()
+            with self.profile_operation('suggest', genre=genre) as stats:
+                if self.conn is not None:
+                    import book_store
+                    book = book_store.random_book(self.conn, genre)
+                else:
+                    df = self.data[1]
+                    book = sample_book(df, genre)
+                    stats['rows_in'] = len(df)
+            if book is None:
+                self.display_error(f"No books found in the {genre} genre.")
+                return
             
-            self.results_text.delete(1.0, tk.END)
+            self.showing_filter_results = False
+            self.clear_results()
             self.results_text.insert(tk.END, "Random Book Suggestion:\n\n")
-            self.results_text.insert(tk.END,
-                f"Title: {book['title']}\n"
-                f"Author: {book['author']}\n"
-                f"Genre: {book['genre']}\n"
-                f"Price: £{book['price']:.2f}\n"
-                f"Rating: {book['rating']}\n"
-                f"Popularity: {book['popularity']:.1f}\n"
-                f"{'-'*50}\n"
-            )
+            self.insert_book(book.name, book)
+            self.select_book(book.name)
         except Exception as e:
             self.log_error("Random suggestion error", e)
             self.display_error("Error suggesting a random book.")
 
+    @contextmanager
+    def profile_operation(self, operation, **params):
+        """Time an operation and log it when profiling is on and it exceeds the threshold"""
+        stats = {}
+        if not self.profile:
+            yield stats
+            return
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            details = ", ".join(f"{key}={value!r}" for key, value in {**params, **stats}.items())
+            if elapsed_ms >= self.slow_ms:
+                logging.warning(f"Slow operation {operation}: {elapsed_ms:.1f} ms ({details})")
+            else:
+                logging.info(f"Operation {operation}: {elapsed_ms:.1f} ms ({details})")
+
     def display_error(self, message):
         """Display error message to user"""
         messagebox.showerror("Error", message)
@@ -282,15 +996,55 @@ class BookFilterApp:
         """Log error to file"""
         logging.error(f"{error_type}: {str(error_message)}\n{traceback.format_exc()}")
 
+def parse_args():
+    """Parse the command line options"""
+    parser = argparse.ArgumentParser(description="Book Filter Application")
+    parser.add_argument('--profile', action='store_true', default=PROFILE_ENABLED,
+                        help="log the duration of load, filter, sort, render and suggest operations")
+    parser.add_argument('--slow-ms', type=float, default=SLOW_OPERATION_MS,
+                        help="operations slower than this are logged as warnings (default: %(default)s)")
+    parser.add_argument('--cprofile', action='store_true',
+                        help="write a cProfile dump of the whole session, worker threads included (book_filter_app_<timestamp>.prof)")
+    parser.add_argument('--no-snapshot', action='store_true',
+                        help="always parse scraped_books.csv instead of using the binary snapshot")
+    parser.add_argument('--startup-time', action='store_true',
+                        help="print how long it took to show the window and to load the data")
+    parser.add_argument('--sqlite', nargs='?', const=DATABASE_FILE, metavar='DB_FILE',
+                        help="query the cleaned_books table of an SQLite database page by page "
+                             "instead of loading the catalogue into memory (default: %(const)s)")
+    return parser.parse_args()
+
 def main():
     """Main application entry point"""
+    global thread_profiles
+    args = parse_args()
+    profiler = cProfile.Profile() if args.cprofile else None
+    if profiler:
+        thread_profiles = []
     try:
+        if profiler:
+            profiler.enable()
         root = tk.Tk()
-        app = BookFilterApp(root)
+        app = BookFilterApp(root, profile=args.profile, slow_ms=args.slow_ms,
+                            use_snapshot=not args.no_snapshot, report_startup=args.startup_time,
+                            database=args.sqlite)
         root.mainloop()
     except Exception as e:
         logging.error(f"Application crash: {str(e)}\n{traceback.format_exc()}")
         messagebox.showerror("Fatal Error", "Application failed to start.")
+    finally:
+        if profiler:
+            profiler.disable()
+            import pstats
+
+            # Worker threads still running when the window is closed are not included
+            stats = pstats.Stats(profiler)
+            for thread_profile in list(thread_profiles):
+                stats.add(thread_profile)
+            profile_file = f"book_filter_app_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof"
+            stats.dump_stats(profile_file)
+            print(f"cProfile dump saved to {profile_file} "
+                  f"(main thread and {len(thread_profiles)} worker threads)")
 
 if __name__ == "__main__":
     main()
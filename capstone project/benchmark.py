@@ -0,0 +1,277 @@
+#BM code generates 1 file per run: benchmark_results/benchmark_<timestamp>.json
+#Usage: python benchmark.py [--sizes 10000 100000 1000000] [--repeat 3] [--compare old_results.json]
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from bs4 import BeautifulSoup
+
+import book_snapshot
+from book_enrichment import enrich_books
+from book_similarity import BookSimilarityIndex
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(HERE, 'benchmark_fixtures')
+RESULTS_DIR = os.path.join(HERE, 'benchmark_results')
+
+GENRES = ['Poetry', 'Historical Fiction', 'Fiction', 'Mystery', 'History', 'Young Adult',
+          'Business', 'Default', 'Science Fiction', 'Romance', 'Fantasy', 'Travel',
+          'Nonfiction', 'Sequential Art', 'Childrens', 'Classics', 'Philosophy', 'Horror',
+          'Music', 'Science', 'Politics', 'Religion', 'Humor', 'Psychology']
+RATINGS = np.array(['One', 'Two', 'Three', 'Four', 'Five'])
+RENDER_ROWS = 10_000    # books written to the results area by the rendering benchmark
+
+
+def load_script(module_name, filename):
+    """Import one of the project scripts (their file names contain spaces)"""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(HERE, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate_catalogue(n, seed=42):
+    """Generate a synthetic catalogue of n books in the scraped_books.csv schema"""
+    rng = np.random.default_rng(seed)
+    ids = np.arange(n)
+    rating_idx = rng.integers(0, 5, n)
+    prices = rng.uniform(10, 60, n).round(2)
+    stock = rng.integers(0, 30, n)
+    return pd.DataFrame({
+        'title': [f"Synthetic Book {i}" for i in ids],
+        'author': 'Unknown',
+        'genre': np.array(GENRES)[rng.integers(0, len(GENRES), n)],
+        'price': [f"£{p:.2f}" for p in prices],
+        'rating': RATINGS[rating_idx],
+        'availability': 'In stock',
+        'upc': [f"{u:016x}" for u in rng.integers(0, 2**63, n)],
+        'publication_year': 'N/A',
+        'detail_availability': [f"In stock ({s} available)" for s in stock],
+        'page': ids // 20 + 1,
+        'position': ids % 20 + 1,
+        'ranking': ids + 1,
+        'popularity': (rating_idx + 1) * 10 + 20 - np.minimum(stock, 20),
+    })
+
+
+class TextSink:
+    """Stand-in for the results text area, so that the rendering loop can be timed without a display
+
+    Only the Python side is measured (iterating the rows and formatting every book), not Tk itself.
+    """
+    def __init__(self):
+        self.chunks = []
+        self.lines = 1
+
+    def delete(self, start, end):
+        self.chunks = []
+        self.lines = 1
+
+    def insert(self, index, text):
+        self.chunks.append(text)
+        self.lines += text.count('\n')
+
+    def index(self, index):
+        return f"{self.lines}.0"
+
+
+def headless_app(app_module, snapshot):
+    """Application object showing the given snapshot, without a window"""
+    app = app_module.BookFilterApp.__new__(app_module.BookFilterApp)
+    app.profile = False
+    app.data = (snapshot, snapshot.frame())
+    app.conn = None
+    app.results_text = TextSink()
+
+    def display_error(message):
+        raise RuntimeError(message)
+    app.display_error = display_error
+    return app
+
+
+def time_call(func, repeat):
+    """Run func repeat times and return timing statistics in seconds"""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return {
+        'min': round(min(runs), 6),
+        'median': round(statistics.median(runs), 6),
+        'mean': round(statistics.mean(runs), 6),
+        'runs': len(runs),
+    }
+
+
+def benchmark_html(collection, repeat):
+    """Time HTML parsing and field extraction on the stored fixtures"""
+    with open(os.path.join(FIXTURES_DIR, 'listing_page.html'), 'rb') as f:
+        listing_html = f.read()
+    with open(os.path.join(FIXTURES_DIR, 'book_page.html'), 'rb') as f:
+        book_html = f.read()
+
+    def parse_listing():
+        soup = BeautifulSoup(listing_html, 'html.parser')
+        return [collection.extract_listing_book(book)
+                for book in soup.find_all('article', class_='product_pod')]
+
+    def parse_book():
+        return collection.extract_book_details(BeautifulSoup(book_html, 'html.parser'))
+
+    return {
+        'html_listing_page': time_call(parse_listing, repeat),
+        'html_book_page': time_call(parse_book, repeat),
+    }
+
+
+def benchmark_catalogue(n, repeat, workdir, processing, app_module):
+    """Time the cleaning, loading, filtering and sampling hot paths on n synthetic books"""
+    csv_file = os.path.join(workdir, f'books_{n}.csv')
+    scraped = generate_catalogue(n)
+    scraped.to_csv(csv_file, index=False)
+    cleaned_file = os.path.join(workdir, f'cleaned_{n}.csv')
+    results = {}
+    
+    # Derived columns of the whole crawl (ranking, rating_numeric, stock, popularity)
+    results['enrich_books'] = time_call(lambda: enrich_books(scraped), repeat)
+
+    def clean():
+        # clean_book_data prints its summaries; keep them out of the benchmark output
+        with contextlib.redirect_stdout(io.StringIO()):
+            df = processing.clean_book_data(csv_file, output_file=cleaned_file, report_file=None,
+                                            snapshot_file=None)
+        if df is None:
+            raise RuntimeError(f"clean_book_data failed on {csv_file}")
+    results['clean_book_data'] = time_call(clean, repeat)
+
+    app = app_module.BookFilterApp.__new__(app_module.BookFilterApp)
+    results['load_and_clean_data'] = time_call(lambda: app.load_and_clean_data(csv_file), repeat)
+    df = app.load_and_clean_data(csv_file)
+
+    # Startup path: memory-mapped snapshot instead of parsing and cleaning the CSV
+    snapshot_file = os.path.join(workdir, f'books_{n}.snap')
+    results['save_snapshot'] = time_call(lambda: book_snapshot.save_snapshot(df, snapshot_file), repeat)
+    results['load_snapshot'] = time_call(lambda: book_snapshot.BookSnapshot(snapshot_file).frame(), repeat)
+
+    filter_books = app_module.filter_books
+    results['filter_genre'] = time_call(lambda: filter_books(df, 'Poetry'), repeat)
+    results['filter_price_range'] = time_call(lambda: filter_books(df, min_price=20, max_price=40), repeat)
+    results['filter_all_sorted'] = time_call(
+        lambda: filter_books(df, 'Mystery', 15, 45, 3, 'popularity'), repeat)
+
+    # "More Like This": feature matrix built once, then one lookup per click
+    snapshot = book_snapshot.BookSnapshot(snapshot_file)
+    frame = snapshot.frame()
+    titles = snapshot.column('title').to_list()
+    results['similarity_build'] = time_call(lambda: BookSimilarityIndex(frame, titles), repeat)
+    index = BookSimilarityIndex(frame, titles)
+    results['similarity_lookup'] = time_call(lambda: index.most_similar(n // 2, 10), repeat)
+
+    # Results list: display_results -> insert_book -> format_book for the first RENDER_ROWS books
+    app = headless_app(app_module, snapshot)
+    shown = frame.head(RENDER_ROWS)
+    results['render_results'] = time_call(lambda: app.display_results(shown), repeat)
+    # What the window does at startup and on "Reset Filters": only the first page is rendered
+    results['show_all_books'] = time_call(app.display_all_books, repeat)
+
+    sample_book = app_module.sample_book
+    results['sample_book_all'] = time_call(lambda: sample_book(df), repeat)
+    results['sample_book_genre'] = time_call(lambda: sample_book(df, 'Fantasy'), repeat)
+    return results
+
+
+def benchmark_startup(repeat):
+    """Time a cold import of the application module in a fresh interpreter"""
+    def import_app():
+        subprocess.run([sys.executable, '-c', 'import Book_Filter_App'], cwd=HERE, check=True)
+    return {'import_app': time_call(import_app, repeat)}
+
+
+def git_commit():
+    """Return the current commit id, if available"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return 'unknown'
+
+
+def run_benchmarks(sizes, repeat):
+    """Run the whole suite and return the results dictionary"""
+    collection = load_script('data_collection', 'data collection.py')
+    processing = load_script('data_processing', 'data processing.py')
+    import Book_Filter_App as app_module
+
+    results = {
+        'commit': git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'repeat': repeat,
+        'benchmarks': {},
+    }
+    print("Benchmarking application import...")
+    results['benchmarks']['startup'] = benchmark_startup(repeat)
+    print("Benchmarking HTML extraction...")
+    results['benchmarks']['html'] = benchmark_html(collection, repeat)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in sizes:
+            print(f"Benchmarking catalogue of {n} books...")
+            results['benchmarks'][str(n)] = benchmark_catalogue(n, repeat, workdir, processing, app_module)
+    return results
+
+
+def compare_results(current, baseline):
+    """Print the median timing ratio of every benchmark against a previous run"""
+    print(f"\nComparison against commit {baseline.get('commit', 'unknown')} (ratio > 1 means slower):")
+    for group, benchmarks in current['benchmarks'].items():
+        for name, stats in benchmarks.items():
+            old = baseline.get('benchmarks', {}).get(group, {}).get(name)
+            if not old or not old['median']:
+                continue
+            ratio = stats['median'] / old['median']
+            print(f"{group:>8} {name:<22} {old['median']:.6f}s -> {stats['median']:.6f}s  x{ratio:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the book scraping, cleaning and filtering hot paths")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help="catalogue sizes to generate")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per benchmark")
+    parser.add_argument('--output', help="results file (default: benchmark_results/benchmark_<timestamp>.json)")
+    parser.add_argument('--compare', help="previous results file to compare against")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.repeat)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4)
+    print(f"Benchmark results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare_results(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
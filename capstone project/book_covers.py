@@ -0,0 +1,154 @@
+#BC code downloads the cover images of the books into a content-addressed store ('covers' folder)
+#   covers/objects/ab/<sha256>     original image, named after the hash of its content (identical covers are stored once)
+#   covers/thumbs/<sha256>.png     thumbnail scaled once when the cover is stored (PNG can be shown by Tk directly)
+#   covers/index.json              cover URL -> hash, so that known covers are not downloaded again
+#The covers are downloaded by a pool of threads while the crawl continues with the book pages;
+#Book_Filter_App.py shows the thumbnails through a CoverCache.
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+try:
+    from PIL import Image
+except ImportError:
+    # Pillow is optional: without it the covers are still downloaded, but no thumbnails are made
+    Image = None
+
+COVERS_DIR = 'covers'
+THUMBNAIL_SIZE = (60, 90)   # maximum width and height in pixels
+MAX_WORKERS = 8             # covers downloaded at the same time
+CACHE_SIZE = 64             # decoded thumbnails kept in memory by the application
+
+
+def image_path(digest, directory=COVERS_DIR):
+    """Path of the original image with the given hash"""
+    return os.path.join(directory, 'objects', digest[:2], digest)
+
+
+def thumbnail_path(digest, directory=COVERS_DIR):
+    """Path of the thumbnail of the image with the given hash"""
+    return os.path.join(directory, 'thumbs', f"{digest}.png")
+
+
+def write_file(path, data):
+    """Write a file atomically, so that a reader never sees half of it"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+class CoverStore:
+    def __init__(self, directory=COVERS_DIR, max_workers=MAX_WORKERS, thumbnail_size=THUMBNAIL_SIZE):
+        """Open the store and start the download threads"""
+        self.directory = directory
+        self.thumbnail_size = thumbnail_size
+        self.index_file = os.path.join(directory, 'index.json')
+        self.index = {}
+        if os.path.exists(self.index_file):
+            with open(self.index_file, encoding='utf-8') as f:
+                self.index = json.load(f)
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.futures = {}
+        self.downloaded = 0
+        self.failed = 0
+
+    def fetch(self, url):
+        """Start downloading a cover in the background and return its future (the hash, or None)"""
+        if url not in self.futures:
+            self.futures[url] = self.executor.submit(self.download, url)
+        return self.futures[url]
+
+    def cover(self, url):
+        """Return the hash of a cover, waiting for its download if needed (None if it failed)"""
+        return self.fetch(url).result() if url else None
+
+    def download(self, url):
+        """Download one cover and store it (runs in a worker thread)"""
+        with self.lock:
+            digest = self.index.get(url)
+        if digest and os.path.exists(image_path(digest, self.directory)):
+            # Covers stored before Pillow was installed (or before a crash) still get their thumbnail
+            try:
+                self.make_thumbnail(digest)
+            except Exception as e:
+                print(f"Error making the thumbnail of cover {url}: {str(e)}")
+            return digest
+        try:
+            response = requests.get(url, timeout=30)
+            response.raise_for_status()
+            digest = self.store(response.content)
+        except Exception as e:
+            with self.lock:
+                self.failed += 1
+            print(f"Error downloading cover {url}: {str(e)}")
+            return None
+        with self.lock:
+            self.index[url] = digest
+            self.downloaded += 1
+        return digest
+
+    def store(self, data):
+        """Save an image under the hash of its content, make its thumbnail and return the hash"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = image_path(digest, self.directory)
+        if not os.path.exists(path):
+            write_file(path, data)
+        self.make_thumbnail(digest)
+        return digest
+
+    def make_thumbnail(self, digest):
+        """Scale the image down once and save it as PNG (skipped without Pillow)"""
+        path = thumbnail_path(digest, self.directory)
+        if Image is None or os.path.exists(path):
+            return
+        with Image.open(image_path(digest, self.directory)) as image:
+            image.thumbnail(self.thumbnail_size)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            image.save(temp_path, 'PNG')
+        os.replace(temp_path, path)
+
+    def close(self):
+        """Wait for the downloads still running and save the URL index"""
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            data = json.dumps(self.index, indent=1).encode('utf-8')
+        write_file(self.index_file, data)
+
+
+class CoverCache:
+    def __init__(self, directory=COVERS_DIR, size=CACHE_SIZE):
+        """Keep at most `size` decoded thumbnails, dropping the least recently used ones"""
+        self.directory = directory
+        self.size = size
+        self.images = OrderedDict()
+
+    def get(self, digest):
+        """Return the thumbnail of a cover as a Tk PhotoImage, or None if there is no thumbnail"""
+        if digest in self.images:
+            self.images.move_to_end(digest)
+            return self.images[digest]
+        path = thumbnail_path(digest, self.directory)
+        if not os.path.exists(path):
+            return None
+        import tkinter as tk
+
+        image = tk.PhotoImage(file=path)
+        self.images[digest] = image
+        if len(self.images) > self.size:
+            # Dropping the last reference frees the Tk image
+            self.images.popitem(last=False)
+        return image
+
+    def clear(self):
+        """Forget all decoded thumbnails"""
+        self.images.clear()
@@ -0,0 +1,96 @@
+#BE code computes the derived columns of the scraped books (ranking, rating_numeric, stock, popularity)
+#data collection.py only stores what it reads from the website; the derived columns are computed here for
+#the whole batch at once, so they can be recomputed with another popularity formula without crawling again:
+#   python book_enrichment.py --popularity "rating_numeric * 5 + scarcity"   (rewrites scraped_books.csv)
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import book_store
+
+RATING_MAP = {'One': 1, 'Two': 2, 'Three': 3, 'Four': 4, 'Five': 5}
+BOOKS_PER_PAGE = 20     # books per listing page of books.toscrape.com
+STOCK_CAP = 20          # stock counts above this make no difference to the popularity
+
+# Popularity as a pandas expression of the columns below: a high rating and a low stock count
+# (the book sells out) make a book popular
+#   rating_numeric  1-5 stars (0 if unknown)
+#   stock           number of copies available, from the book page
+#   scarcity        STOCK_CAP minus the stock, 0 when the stock is STOCK_CAP or more
+#   price           price in £
+#   ranking         position in the listing (1 = first book)
+POPULARITY_FORMULA = "rating_numeric * 10 + scarcity"
+
+
+def parse_stock(availability):
+    """Extract the 'N' of 'In stock (N available)' from a column of texts (0 where there is none)"""
+    counts = availability.astype(str).str.extract(r'\((\d+) available\)', expand=False)
+    return pd.to_numeric(counts, errors='coerce').fillna(0).astype(np.int64)
+
+
+def compute_popularity(df, formula=POPULARITY_FORMULA, stock_cap=STOCK_CAP):
+    """Evaluate the popularity formula for every book of an enriched data frame"""
+    variables = pd.DataFrame({
+        'rating_numeric': df['rating_numeric'],
+        'stock': df['stock'],
+        'scarcity': stock_cap - np.minimum(df['stock'], stock_cap),
+        'price': pd.to_numeric(df['price'].astype(str).str.replace('£', '', regex=False), errors='coerce'),
+        'ranking': df['ranking'],
+    }, index=df.index)
+    return variables.eval(formula)
+
+
+def enrich_books(df, formula=POPULARITY_FORMULA, stock_cap=STOCK_CAP):
+    """Add ranking, rating_numeric, stock and popularity to a batch of scraped books"""
+    df = df.copy()
+
+    # Ranking: position on the website (older files without page/position keep their ranking)
+    if 'page' in df.columns and 'position' in df.columns:
+        df['ranking'] = (df['page'] - 1) * BOOKS_PER_PAGE + df['position']
+    elif 'ranking' not in df.columns:
+        df['ranking'] = np.arange(1, len(df) + 1)
+
+    df['rating_numeric'] = df['rating'].map(RATING_MAP).fillna(0).astype(np.int64)
+
+    # The listing only says 'In stock'; the count is on the book page
+    if 'detail_availability' in df.columns:
+        df['stock'] = parse_stock(df['detail_availability'])
+    else:
+        df['stock'] = parse_stock(df['availability'])
+
+    df['popularity'] = compute_popularity(df, formula, stock_cap)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute the derived columns of the scraped books")
+    parser.add_argument('--csv', default='scraped_books.csv', help="scraped data to update (default: %(default)s)")
+    parser.add_argument('--popularity', default=POPULARITY_FORMULA,
+                        help="popularity formula (default: %(default)r)")
+    parser.add_argument('--stock-cap', type=int, default=STOCK_CAP,
+                        help="stock count above which scarcity is 0 (default: %(default)s)")
+    parser.add_argument('--sqlite', nargs='?', const=book_store.DATABASE_FILE, metavar='DB_FILE',
+                        help="update the scraped_books table of an SQLite database instead (default: %(const)s)")
+    args = parser.parse_args()
+
+    try:
+        if args.sqlite:
+            conn = book_store.connect(args.sqlite)
+            df = enrich_books(book_store.read_books(conn), args.popularity, args.stock_cap)
+            book_store.upsert_books(conn, df.to_dict('records'))
+            conn.close()
+            print(f"Updated {len(df)} books in the {book_store.SCRAPED_TABLE} table of {args.sqlite}")
+        else:
+            df = enrich_books(pd.read_csv(args.csv), args.popularity, args.stock_cap)
+            df.to_csv(args.csv, index=False)
+            print(f"Updated {len(df)} books in {args.csv}")
+    except Exception as e:
+        print(f"Error recomputing the derived columns: {str(e)}")
+        return
+    print("Run data processing.py again to update the cleaned data")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#BF code counts how many books each filter value would return (the numbers shown next to the filters)
+#Every count is computed under the other active filters, with one np.bincount per filter.
+
+import numpy as np
+
+# Price buckets (in £): 0-10, 10-20, ..., 50-60 and 60+
+PRICE_EDGES = [10, 20, 30, 40, 50, 60]
+RATINGS = [1, 2, 3, 4, 5]
+
+
+def grow(array, size):
+    """Return the array with room for size values along its last axis (reallocated with spare room,
+    zero-filled, only when it is too small, so that adding books one reload at a time stays cheap)"""
+    capacity = array.shape[-1]
+    if capacity >= size:
+        return array
+    grown = np.zeros(array.shape[:-1] + (max(size, capacity + capacity // 4),), dtype=array.dtype)
+    grown[..., :capacity] = array
+    return grown
+
+
+def price_bucket_labels(edges=PRICE_EDGES):
+    """Return a label per price bucket, e.g. '£10-20'"""
+    bounds = [0] + list(edges)
+    labels = [f"£{low}-{high}" for low, high in zip(bounds, bounds[1:])]
+    return labels + [f"£{edges[-1]}+"]
+
+
+class FacetCounter:
+    def __init__(self, df, price_edges=PRICE_EDGES):
+        """Precompute the category code of every book for each filter"""
+        self.genres = list(df['genre'].cat.categories)
+        # Shift by one so that missing genres (code -1) can be counted by bincount
+        self.genre_codes = df['genre'].cat.codes.to_numpy().astype(np.int64) + 1
+        # Only genres that have books are offered (a reload can leave unused categories)
+        self.genre_totals = np.bincount(self.genre_codes, minlength=len(self.genres) + 1)
+        self.present_genres = self.genre_totals[1:] > 0
+        self.rating_codes = np.nan_to_num(df['rating_numeric'].to_numpy(dtype=float)).astype(np.int64).clip(0, 5)
+        self.prices = df['price'].to_numpy(dtype=float)
+        self.price_edges = price_edges
+        self.price_codes = np.digitize(self.prices, price_edges)
+        self.price_labels = price_bucket_labels(price_edges)
+        # The code arrays may be longer than the data after a patch: only the first size values are books
+        self.size = len(df)
+
+    def patch(self, df, changes):
+        """Update the codes in place for a new snapshot version: only the changed rows are recomputed
+
+        changes is the change record of book_snapshot.align_to_snapshot; the rows that are not listed
+        hold the same books as before, and the genre codes of the previous version stay valid.
+        """
+        rows = np.asarray(changes['rows'], dtype=np.int64)
+        old_size, size = self.size, len(df)
+        # Take out the books that left their row (replaced, or past the new end)
+        gone = np.concatenate([rows[rows < old_size], np.arange(size, old_size)])
+        np.subtract.at(self.genre_totals, self.genre_codes[gone], 1)
+
+        self.genres = list(df['genre'].cat.categories)
+        self.genre_totals = grow(self.genre_totals, len(self.genres) + 1)
+        self.genre_codes = grow(self.genre_codes, size)
+        self.rating_codes = grow(self.rating_codes, size)
+        self.price_codes = grow(self.price_codes, size)
+        # The prices are a view of the new snapshot
+        self.prices = df['price'].to_numpy(dtype=float)
+
+        self.genre_codes[rows] = df['genre'].cat.codes.to_numpy()[rows].astype(np.int64) + 1
+        ratings = df['rating_numeric'].to_numpy(dtype=float)[rows]
+        self.rating_codes[rows] = np.nan_to_num(ratings).astype(np.int64).clip(0, 5)
+        self.price_codes[rows] = np.digitize(self.prices[rows], self.price_edges)
+        np.add.at(self.genre_totals, self.genre_codes[rows], 1)
+        self.size = size
+        self.present_genres = self.genre_totals[1:len(self.genres) + 1] > 0
+
+    def counts(self, genre='All', min_price=None, max_price=None, min_rating=None):
+        """Return the number of matches per genre, per minimum rating and per price bucket
+
+        Each facet ignores its own filter, so it shows what picking another value would give.
+        """
+        genre_codes = self.genre_codes[:self.size]
+        rating_codes = self.rating_codes[:self.size]
+        price_codes = self.price_codes[:self.size]
+        everything = np.ones(self.size, dtype=bool)
+        genre_mask = everything
+        if genre != 'All' and genre in self.genres:
+            genre_mask = genre_codes == self.genres.index(genre) + 1
+        elif genre != 'All':
+            genre_mask = ~everything
+        price_mask = everything
+        if min_price is not None:
+            price_mask = price_mask & (self.prices >= min_price)
+        if max_price is not None:
+            price_mask = price_mask & (self.prices <= max_price)
+        rating_mask = everything
+        if min_rating is not None:
+            rating_mask = rating_codes >= min_rating
+
+        genre_counts = np.bincount(genre_codes[price_mask & rating_mask],
+                                   minlength=len(self.genres) + 1)[1:]
+        # "Minimum rating" filter: books rated r or higher, i.e. a reversed cumulative sum
+        rating_counts = np.bincount(rating_codes[genre_mask & price_mask], minlength=6)
+        at_least = np.cumsum(rating_counts[::-1])[::-1]
+        price_counts = np.bincount(price_codes[genre_mask & rating_mask],
+                                   minlength=len(self.price_labels))
+
+        return {
+            'total': int((genre_mask & price_mask & rating_mask).sum()),
+            'genre': {name: count for name, count, present
+                      in zip(self.genres, genre_counts.tolist(), self.present_genres) if present},
+            'rating': {rating: int(at_least[rating]) for rating in RATINGS},
+            'price': dict(zip(self.price_labels, price_counts.tolist())),
+        }
@@ -0,0 +1,201 @@
+#BH code keeps the price, stock and availability history of every book across crawls ('book_history.db')
+#The history is append-only and only stores what changed, so a crawl that finds the same prices adds nothing:
+#   upcs:          dictionary of the UPCs (every change refers to a small integer id)
+#   availability:  dictionary of the availability texts of the listing ('In stock', NOT_LISTED)
+#   crawls:        one row per crawl with its date
+#   changes:       one row per book per crawl in which something changed, stored by (upc_id, crawl_id)
+#                  so that the history of one book is a single index range;
+#                  price_delta is the price change in pence (the first row of a book holds its full price),
+#                  stock_delta the change of the number of copies in stock (encoded the same way),
+#                  availability_id is NULL when the availability did not change
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+HISTORY_FILE = 'book_history.db'
+NOT_LISTED = 'Not listed'   # availability recorded when a book disappears from the website
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS upcs (upc_id INTEGER PRIMARY KEY, upc TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS availability (availability_id INTEGER PRIMARY KEY, value TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS crawls (crawl_id INTEGER PRIMARY KEY, crawled_at TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS changes (
+    upc_id INTEGER NOT NULL,
+    crawl_id INTEGER NOT NULL,
+    price_delta INTEGER,
+    availability_id INTEGER,
+    stock_delta INTEGER,
+    PRIMARY KEY (upc_id, crawl_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_changes_crawl ON changes (crawl_id);
+CREATE INDEX IF NOT EXISTS idx_crawls_date ON crawls (crawled_at);
+"""
+
+
+def connect(path=HISTORY_FILE):
+    """Open the history database and create the tables if needed"""
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    # Histories written before the stock was recorded: their books start with an unknown stock
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(changes)")]
+    if 'stock_delta' not in columns:
+        conn.execute("ALTER TABLE changes ADD COLUMN stock_delta INTEGER")
+    return conn
+
+
+def to_pence(prices):
+    """Convert prices such as '£51.77' (or numbers in pounds) to integer pence; NaN if not a price"""
+    pounds = pd.to_numeric(pd.Series(prices).astype(str).str.replace('£', '', regex=False), errors='coerce')
+    return (pounds * 100).round()
+
+
+def dictionary_ids(conn, table, id_column, value_column, values):
+    """Return the id of every value, adding the values that are not in the dictionary yet"""
+    values = pd.unique(pd.Series(values, dtype=object))
+    conn.executemany(f"INSERT OR IGNORE INTO {table} ({value_column}) VALUES (?)", [(v,) for v in values])
+    return dict(conn.execute(f"SELECT {value_column}, {id_column} FROM {table}"))
+
+
+def availability_id(conn, value):
+    """Return the dictionary id of an availability text, or None"""
+    row = conn.execute("SELECT availability_id FROM availability WHERE value = ?", (value,)).fetchone()
+    return row[0] if row else None
+
+
+def book_states(conn, crawl_id=None):
+    """Return the price (in pence), stock and availability id of every book as of a crawl (default: the last one)"""
+    if crawl_id is None:
+        crawl_id = conn.execute("SELECT COALESCE(MAX(crawl_id), 0) FROM crawls").fetchone()[0]
+    changes = pd.read_sql_query(
+        "SELECT upc_id, crawl_id, price_delta, stock_delta, availability_id FROM changes WHERE crawl_id <= ? "
+        "ORDER BY upc_id, crawl_id", conn, params=[crawl_id])
+    grouped = changes.groupby('upc_id')
+    return pd.DataFrame({
+        'price': grouped['price_delta'].sum(min_count=1),
+        'stock': grouped['stock_delta'].sum(min_count=1),
+        # last() skips the NULLs, i.e. the crawls in which the availability did not change
+        'availability_id': grouped['availability_id'].last(),
+    })
+
+
+def record_crawl(df, path=HISTORY_FILE, crawled_at=None, complete=True):
+    """Append the changes found by a crawl (a data frame with upc, price, availability and stock columns)
+
+    Books that are not in the data frame are recorded as NOT_LISTED (with no copies in stock) only when
+    the crawl is complete: a book whose page could not be fetched is still on the website.
+    A missing stock column (or a missing value) keeps the last known stock.
+    Returns the number of books whose price, stock or availability changed (new books included).
+    """
+    crawled_at = crawled_at or datetime.now()
+    conn = connect(path)
+    try:
+        with conn:
+            previous = book_states(conn)
+            crawl_id = conn.execute("INSERT INTO crawls (crawled_at) VALUES (?)",
+                                    (crawled_at.isoformat(timespec='seconds'),)).lastrowid
+
+            df = df.drop_duplicates('upc', keep='last')
+            upc_ids = dictionary_ids(conn, 'upcs', 'upc_id', 'upc', df['upc'])
+            availability_ids = dictionary_ids(conn, 'availability', 'availability_id', 'value',
+                                              list(df['availability'].fillna('')) + [NOT_LISTED])
+            current = pd.DataFrame({
+                'price': to_pence(df['price']).to_numpy(),
+                'stock': (pd.to_numeric(df['stock'], errors='coerce').to_numpy() if 'stock' in df.columns
+                          else np.nan),
+                'availability_id': df['availability'].fillna('').map(availability_ids).to_numpy(),
+            }, index=pd.Index(df['upc'].map(upc_ids).to_numpy(), name='upc_id'))
+
+            # Books that were listed before but not in this crawl
+            if complete:
+                not_listed = availability_ids[NOT_LISTED]
+                missing = previous.index.difference(current.index)
+                missing = missing[previous.loc[missing, 'availability_id'] != not_listed]
+                current = pd.concat([current, pd.DataFrame({'price': np.nan, 'stock': 0,
+                                                            'availability_id': not_listed}, index=missing)])
+
+            old = previous.reindex(current.index)
+            # A missing price (not parsed, or book no longer listed) keeps the last known price
+            price_delta = current['price'] - old['price'].fillna(0)
+            price_delta[current['price'].isna()] = np.nan
+            stock_delta = current['stock'] - old['stock'].fillna(0)
+            stock_delta[current['stock'].isna()] = np.nan
+            availability = current['availability_id'].where(
+                current['availability_id'] != old['availability_id'])
+
+            changed = (price_delta.fillna(0) != 0) | (stock_delta.fillna(0) != 0) | availability.notna()
+            rows = [(int(upc_id), crawl_id,
+                     None if pd.isna(delta) or delta == 0 else int(delta),
+                     None if pd.isna(stock) or stock == 0 else int(stock),
+                     None if pd.isna(value) else int(value))
+                    for upc_id, delta, stock, value in zip(current.index[changed], price_delta[changed],
+                                                           stock_delta[changed], availability[changed])]
+            conn.executemany("INSERT INTO changes (upc_id, crawl_id, price_delta, stock_delta, availability_id) "
+                             "VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+    finally:
+        conn.close()
+
+
+def price_history(conn, upc):
+    """Return the price, stock and availability of one book at every crawl in which it changed"""
+    history = pd.read_sql_query(
+        "SELECT c.crawled_at, SUM(h.price_delta) OVER (ORDER BY h.crawl_id) / 100.0 AS price, "
+        "SUM(h.stock_delta) OVER (ORDER BY h.crawl_id) AS stock, a.value AS availability "
+        "FROM changes h JOIN crawls c ON c.crawl_id = h.crawl_id "
+        "LEFT JOIN availability a ON a.availability_id = h.availability_id "
+        "WHERE h.upc_id = (SELECT upc_id FROM upcs WHERE upc = ?) ORDER BY h.crawl_id",
+        conn, params=[upc], parse_dates=['crawled_at'])
+    history['availability'] = history['availability'].ffill()
+    return history
+
+
+def crawl_before(conn, when):
+    """Return the id of the last crawl made on or before the given date (or the first crawl)"""
+    row = conn.execute("SELECT MAX(crawl_id) FROM crawls WHERE crawled_at <= ?",
+                       (when.isoformat(timespec='seconds'),)).fetchone()
+    if row[0] is not None:
+        return row[0]
+    return conn.execute("SELECT MIN(crawl_id) FROM crawls").fetchone()[0]
+
+
+def price_drops(conn, since=timedelta(days=7)):
+    """Return the books whose price is lower now than at the last crawl before `since` ago"""
+    baseline = crawl_before(conn, datetime.now() - since)
+    if baseline is None:
+        return pd.DataFrame(columns=['upc', 'old_price', 'new_price', 'change'])
+    then = book_states(conn, baseline)
+    now = book_states(conn)
+    listed = now['availability_id'] != availability_id(conn, NOT_LISTED)
+    both = now[listed].join(then, rsuffix='_then', how='inner')
+    drops = both[both['price'] < both['price_then']]
+    upcs = dict(conn.execute("SELECT upc_id, upc FROM upcs"))
+    result = pd.DataFrame({
+        'upc': drops.index.map(upcs),
+        'old_price': drops['price_then'].to_numpy() / 100,
+        'new_price': drops['price'].to_numpy() / 100,
+    })
+    result['change'] = (result['new_price'] - result['old_price']).round(2)
+    return result.sort_values('change').reset_index(drop=True)
+
+
+def crawl_summary(conn):
+    """Return the number of new books, price rises and drops, stock and availability changes of every crawl"""
+    changes = pd.read_sql_query("SELECT upc_id, crawl_id, price_delta, stock_delta, availability_id FROM changes",
+                                conn)
+    first = changes.groupby('upc_id')['crawl_id'].transform('min') == changes['crawl_id']
+    summary = pd.DataFrame({
+        'crawl_id': changes['crawl_id'],
+        'new_books': first,
+        'price_rises': ~first & (changes['price_delta'] > 0),
+        'price_drops': ~first & (changes['price_delta'] < 0),
+        'stock_changes': ~first & changes['stock_delta'].notna(),
+        'availability_changes': ~first & changes['availability_id'].notna(),
+    }).groupby('crawl_id').sum()
+    # Crawls without any change are listed too
+    crawls = pd.read_sql_query("SELECT crawl_id, crawled_at FROM crawls ORDER BY crawl_id", conn)
+    summary = summary.reindex(crawls['crawl_id'], fill_value=0)
+    summary.index = pd.Index(crawls['crawled_at'], name='crawled_at')
+    return summary
@@ -0,0 +1,129 @@
+#SI code finds the books most similar to a given book ("More Like This" in Book_Filter_App.py)
+#Every book is described by its genre, price, rating, popularity and title words; similarity is the
+#cosine between those feature vectors, computed with NumPy for all books at once.
+
+import re
+import zlib
+
+import numpy as np
+
+from book_facets import grow
+
+TITLE_DIMENSIONS = 32   # title words are hashed into this many columns
+GENRE_WEIGHT = 1.0      # weight of "same genre" compared to one standardized numeric feature
+TITLE_WEIGHT = 1.0
+NUMERIC_COLUMNS = ['price', 'rating_numeric', 'popularity']
+
+
+def title_features(titles, dimensions=TITLE_DIMENSIONS):
+    """Hash the words of every title into a fixed number of columns (unit length per title)"""
+    features = np.zeros((len(titles), dimensions), dtype=np.float32)
+    word_columns = {}
+    for i, title in enumerate(titles):
+        for word in re.findall(r'[a-z0-9]+', title.lower()):
+            column = word_columns.get(word)
+            if column is None:
+                column = word_columns[word] = zlib.crc32(word.encode('utf-8')) % dimensions
+            features[i, column] += 1
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    np.divide(features, norms, out=features, where=norms > 0)
+    return features
+
+
+class BookSimilarityIndex:
+    def __init__(self, df, titles, title_dimensions=TITLE_DIMENSIONS,
+                 genre_weight=GENRE_WEIGHT, title_weight=TITLE_WEIGHT, scaling=None):
+        """Build the normalized feature matrix once for the books in df (titles in the same order)
+
+        scaling is the (mean, scale) of the numeric columns; by default it is computed from df.
+        """
+        self.title_dimensions = title_dimensions
+        self.title_weight = title_weight
+        # Frames of a snapshot are indexed by row number: rows and positions are then the same
+        rows = df.index.to_numpy()
+        self.positional = bool(np.array_equal(rows, np.arange(len(rows))))
+        self.rows = None if self.positional else rows
+        self.positions = None if self.positional else {row: position for position, row in enumerate(rows)}
+        self.size = len(rows)
+
+        # Standardize the numeric columns so that no single column dominates the cosine
+        numeric = df[NUMERIC_COLUMNS].to_numpy(dtype=np.float32)
+        if scaling is None:
+            mean = np.nanmean(numeric, axis=0)
+            std = np.nan_to_num(numeric - mean).std(axis=0)
+            scaling = (mean, np.where(std > 0, std, 1).astype(np.float32))
+        self.numeric_mean, self.numeric_scale = scaling
+
+        # The one-hot genre columns are not stored: two books share at most one genre,
+        # so their contribution to the dot product is genre_weight**2 when the genres match
+        self.genre_codes = df['genre'].cat.codes.to_numpy().astype(np.int64)
+        self.genre_term = np.float32(genre_weight ** 2)
+        vectors, self.inverse_norms = self.book_vectors(numeric, titles)
+        # Stored as features x books: one book against all is then a fast row-vector product
+        self.matrix_t = np.ascontiguousarray(vectors.T, dtype=np.float32)
+
+    def book_vectors(self, numeric, titles):
+        """Normalized feature vectors (books x features) and inverse norms of some books"""
+        numeric = np.nan_to_num((numeric - self.numeric_mean) / self.numeric_scale)
+        features = np.hstack([numeric, self.title_weight * title_features(titles, self.title_dimensions)])
+        norms = np.sqrt((features ** 2).sum(axis=1) + self.genre_term)
+        inverse_norms = (1 / norms).astype(np.float32)
+        return features * inverse_norms[:, None], inverse_norms
+
+    def patch(self, df, titles, changes):
+        """Update the index in place for a new snapshot version (titles of the rows in changes['rows'])
+
+        changes is the change record of book_snapshot.align_to_snapshot: only the vectors of those rows
+        are computed. The numeric columns keep the scaling of the last full build.
+        """
+        if not self.positional:
+            raise ValueError("Only an index of snapshot rows can be patched")
+        rows = np.asarray(changes['rows'], dtype=np.int64)
+        size = len(df)
+        self.matrix_t = grow(self.matrix_t, size)
+        self.inverse_norms = grow(self.inverse_norms, size)
+        self.genre_codes = grow(self.genre_codes, size)
+
+        numeric = np.column_stack([df[name].to_numpy()[rows] for name in NUMERIC_COLUMNS]).astype(np.float32)
+        vectors, inverse_norms = self.book_vectors(numeric, titles)
+        self.matrix_t[:, rows] = vectors.T
+        self.inverse_norms[rows] = inverse_norms
+        self.genre_codes[rows] = df['genre'].cat.codes.to_numpy()[rows]
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def scores(self, positions):
+        """Cosine similarity of the books at the given positions against every book"""
+        positions = np.asarray(positions)
+        # The arrays may have spare room after a patch: only the first size columns are books
+        matrix_t = self.matrix_t[:, :self.size]
+        genre_codes = self.genre_codes[:self.size]
+        inverse_norms = self.inverse_norms[:self.size]
+        scores = matrix_t[:, positions].T @ matrix_t
+        for i, position in enumerate(positions):
+            same_genre = genre_codes == genre_codes[position]
+            scores[i, same_genre] += (self.genre_term * inverse_norms[position]
+                                      * inverse_norms[same_genre])
+        # A book is not similar to itself
+        scores[np.arange(len(positions)), positions] = -np.inf
+        return scores
+
+    def top_k(self, scores, k):
+        """Positions and scores of the k highest scores in every row, best first"""
+        k = min(k, scores.shape[1] - 1)
+        if k <= 0:
+            return np.empty((len(scores), 0), dtype=int), np.empty((len(scores), 0), dtype=np.float32)
+        best = np.argpartition(scores, scores.shape[1] - k, axis=1)[:, -k:]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def most_similar(self, row, k=10):
+        """Return the rows and similarity scores of the k books most similar to the given row"""
+        position = row if self.positional else self.positions[row]
+        positions, scores = self.top_k(self.scores([position]), k)
+        if self.positional:
+            return positions[0], scores[0]
+        return self.rows[positions[0]], scores[0]
@@ -0,0 +1,357 @@
+#BS code reads and writes the binary snapshot of the cleaned book data ('cleaned_books.snap')
+#data processing.py writes it with build_snapshot(), from scraped_books.csv cleaned by clean_books() (the same
+#cleaning Book_Filter_App.py applies when it has to read the CSV itself); the header records the size and
+#modification time of the CSV it was built from, so a snapshot of another version of the data is never used.
+#The snapshot is memory-mapped read-only, so several application instances share one copy of the data
+#(the operating system's page cache) and opening it takes the same time whatever the catalogue size.
+#A new snapshot keeps the rows of the previous one (matched by UPC) and its header lists the rows that changed,
+#so a running application updates its filter counts and its "More Like This" index for those rows only.
+#
+#File layout (all offsets are from the start of the file, every section is 8-byte aligned):
+#   magic 'BOOKSNAP' | header length (uint32) | JSON header | column sections
+#   numeric column:  <rows> values of the dtype given in the header
+#   category column: <rows> int32 codes, the labels are stored in the header
+#   string column:   <rows + 1> int64 offsets followed by the UTF-8 blob of all values
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+import uuid
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_FILE = 'cleaned_books.snap'
+MAGIC = b'BOOKSNAP'
+VERSION = 1
+ALIGNMENT = 8
+MAX_CHANGED_FRACTION = 0.5  # above this share of changed books the change record is not worth applying
+
+
+def _padding(size):
+    """Return the number of bytes needed to reach the next aligned offset"""
+    return -size % ALIGNMENT
+
+
+def source_info(source_file):
+    """Identify the version of the file a snapshot is built from (None if the file does not exist)"""
+    if source_file is None or not os.path.exists(source_file):
+        return None
+    stat = os.stat(source_file)
+    return {'file': os.path.abspath(source_file), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def column_kind(column):
+    """How a column is stored in the snapshot: 'category', 'numeric' or 'string'"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return 'category'
+    if pd.api.types.is_bool_dtype(column) or pd.api.types.is_numeric_dtype(column):
+        return 'numeric'
+    return 'string'
+
+
+def snapshot_bytes(df, source=None, changes=None):
+    """Encode the data frame in the snapshot layout and return it as bytes
+
+    source identifies the CSV file (see source_info), changes the difference with the previous
+    snapshot (see align_to_snapshot).
+    """
+    columns = []
+    sections = []
+    for name in df.columns:
+        column = df[name]
+        kind = column_kind(column)
+        if kind == 'category':
+            codes = column.cat.codes.to_numpy().astype('<i4')
+            columns.append({'name': name, 'kind': 'category', 'dtype': '<i4',
+                            'categories': [str(c) for c in column.cat.categories]})
+            sections.append([codes.tobytes()])
+        elif kind == 'numeric':
+            values = column.to_numpy()
+            values = values.astype(values.dtype.newbyteorder('<'))
+            columns.append({'name': name, 'kind': 'numeric', 'dtype': values.dtype.str})
+            sections.append([values.tobytes()])
+        else:
+            encoded = [str(value).encode('utf-8') for value in column.fillna('')]
+            offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+            np.cumsum([len(value) for value in encoded], out=offsets[1:])
+            columns.append({'name': name, 'kind': 'string', 'dtype': '<i8'})
+            sections.append([offsets.tobytes(), b''.join(encoded)])
+
+    # The header stores the section offsets, which depend on the header size: lay out until stable
+    header = {'version': VERSION, 'id': uuid.uuid4().hex, 'rows': len(df), 'source': source,
+              'changes': changes, 'columns': columns}
+    header_size = 0
+    while True:
+        position = len(MAGIC) + 4 + header_size
+        position += _padding(position)
+        for entry, parts in zip(columns, sections):
+            entry['offset'] = position
+            position += len(parts[0]) + _padding(len(parts[0]))
+            if entry['kind'] == 'string':
+                entry['blob_offset'] = position
+                entry['blob_length'] = len(parts[1])
+                position += len(parts[1]) + _padding(len(parts[1]))
+        header_json = json.dumps(header).encode('utf-8')
+        if len(header_json) <= header_size:
+            break
+        header_size = len(header_json)
+
+    out = [MAGIC, struct.pack('<I', header_size), header_json.ljust(header_size)]
+    out.append(b'\0' * _padding(len(MAGIC) + 4 + header_size))
+    for parts in sections:
+        for part in parts:
+            out.append(part)
+            out.append(b'\0' * _padding(len(part)))
+    return b''.join(out)
+
+
+def clean_books(df):
+    """Clean the scraped books the way Book_Filter_App.py shows them (the content of the snapshot)"""
+    # Clean price data
+    df['price'] = pd.to_numeric(df['price'].str.replace('£', ''), errors='coerce')
+    
+    # Map ratings to numeric values
+    rating_map = {'One': 1, 'Two': 2, 'Three': 3, 'Four': 4, 'Five': 5}
+    df['rating_numeric'] = df['rating'].map(rating_map)
+    
+    # Clean genre data
+    df['genre'] = df['genre'].fillna('Unknown').astype('category')
+    
+    # Create popularity metric if not exists
+    if 'popularity' not in df.columns:
+        df['popularity'] = df['rating_numeric'] * 2
+    
+    # Remove any rows with NaN values
+    return df.dropna(subset=['price', 'rating_numeric', 'genre'])
+
+
+def align_to_snapshot(df, base):
+    """Order the books of a new version like the previous snapshot and record what changed, by UPC
+
+    Books that are still listed keep their row, new books take the rows of the removed ones (or go
+    after the last row) and, when the catalogue shrinks, the last books move into the holes that are
+    left, so only the rows of new, updated and moved books differ from the previous snapshot.
+    Returns the reordered frame and the change record (row numbers of the new version, except
+    'deleted'), or the frame in its own order and None when the versions cannot be compared (other
+    columns, duplicate UPCs) or when most of the books changed.
+    """
+    df = df.reset_index(drop=True)
+    kinds = [column_kind(df[name]) for name in df.columns]
+    if (list(df.columns) != list(base.columns) or 'upc' not in df.columns
+            or kinds != [base.columns[name]['kind'] for name in df.columns]
+            or base.columns['upc']['kind'] != 'string'):
+        return df, None
+    old_upc = pd.Index(base.column('upc').to_list())
+    new_upc = pd.Index(df['upc'].fillna('').astype(str))
+    if not old_upc.is_unique or not new_upc.is_unique:
+        return df, None
+
+    # Row of every book of df in the new snapshot, and its row in the previous one (-1: new book)
+    old_size, size = len(old_upc), len(new_upc)
+    old_row = old_upc.get_indexer(new_upc)
+    kept = np.flatnonzero(old_row >= 0)
+    inserted = np.flatnonzero(old_row < 0)
+    removed = np.ones(old_size, dtype=bool)
+    removed[old_row[kept]] = False
+    deleted = np.flatnonzero(removed)
+    row = old_row.copy()
+    filled = min(len(deleted), len(inserted))
+    row[inserted[:filled]] = deleted[:filled]
+    row[inserted[filled:]] = np.arange(old_size, old_size + len(inserted) - filled)
+    past_end = np.flatnonzero(row >= size)
+    if len(past_end):
+        used = np.zeros(size, dtype=bool)
+        used[row[row < size]] = True
+        row[past_end] = np.flatnonzero(~used)
+    moved = kept[row[kept] != old_row[kept]]
+
+    # A kept book is updated when any of its fields changed
+    old_frame = base.frame()
+    changed = np.zeros(len(kept), dtype=bool)
+    for name, kind in zip(df.columns, kinds):
+        if kind == 'string':
+            old_values = np.array(base.column(name).take(old_row[kept]), dtype=object)
+            new_values = df[name].fillna('').astype(str).to_numpy()[kept]
+            changed |= old_values != new_values
+            continue
+        old_values = old_frame[name].to_numpy()[old_row[kept]]
+        new_values = df[name].to_numpy()[kept]
+        if kind == 'category':
+            old_values = old_values.astype(str)
+            new_values = new_values.astype(str)
+        changed |= ~((old_values == new_values) | (pd.isna(old_values) & pd.isna(new_values)))
+    updated = kept[changed]
+    if len(inserted) + len(updated) + len(deleted) > MAX_CHANGED_FRACTION * max(size, 1):
+        return df, None
+
+    # The categories of the previous snapshot keep their codes; new ones are added after them
+    for name, kind in zip(df.columns, kinds):
+        if kind == 'category':
+            categories = base.columns[name]['categories']
+            known = set(categories)
+            categories = categories + [c for c in df[name].cat.categories if str(c) not in known]
+            df[name] = df[name].cat.set_categories(categories)
+
+    changes = {
+        'base': base.id,
+        'base_rows': old_size,
+        'rows': np.unique(row[np.concatenate([inserted, updated, moved])]).tolist(),
+        'inserted': np.sort(row[inserted]).tolist(),
+        'updated': np.sort(row[updated]).tolist(),
+        'deleted': deleted.tolist(),
+        'moved': np.column_stack([old_row[moved], row[moved]]).tolist(),
+    }
+    return df.iloc[np.argsort(row)].reset_index(drop=True), changes
+
+
+def build_snapshot(csv_file='scraped_books.csv', path=SNAPSHOT_FILE):
+    """Clean the scraped CSV file and write its snapshot, in the row order of the previous one
+
+    Returns the number of books and the change record (None if the snapshot was written from scratch).
+    """
+    df = clean_books(pd.read_csv(csv_file)).reset_index(drop=True)
+    changes = None
+    try:
+        base = BookSnapshot(path) if os.path.exists(path) else None
+    except Exception:
+        base = None
+    if base is not None:
+        df, changes = align_to_snapshot(df, base)
+    save_snapshot(df, path, source_file=csv_file, changes=changes)
+    return len(df), changes
+
+
+def save_snapshot(df, path=SNAPSHOT_FILE, source_file=None, changes=None):
+    """Write the snapshot file; readers that have the old file mapped keep seeing the old data"""
+    source = source_info(source_file)
+    # Each writer uses its own temporary file next to the snapshot and then swaps it in, so two
+    # runs at the same time never mix their data and the applications never map half a file
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.',
+                                     suffix='.tmp', dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(snapshot_bytes(df, source, changes))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return path
+
+
+class StringColumn:
+    def __init__(self, offsets, blob):
+        """Lazily decoded view of a string column stored as offsets into a UTF-8 blob"""
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return bytes(self.blob[start:end]).decode('utf-8')
+
+    def take(self, rows):
+        """Decode the values of the given rows"""
+        return [self[row] for row in rows]
+
+    def raw(self, rows):
+        """Return the undecoded UTF-8 values of the given rows (cheaper for comparisons)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        data = self.blob.tobytes()
+        starts = self.offsets[rows].tolist()
+        ends = self.offsets[rows + 1].tolist()
+        return [data[start:end] for start, end in zip(starts, ends)]
+
+    def to_list(self):
+        """Decode the whole column"""
+        return self.take(range(len(self)))
+
+
+class BookSnapshot:
+    def __init__(self, path=SNAPSHOT_FILE, buffer=None):
+        """Open a snapshot file read-only (or wrap an in-memory snapshot given as buffer)"""
+        self.path = path
+        self.mmap = None
+        if buffer is None:
+            with open(path, 'rb') as f:
+                self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            buffer = self.mmap
+        self.buffer = memoryview(buffer)
+
+        if bytes(self.buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a book snapshot")
+        header_size = struct.unpack_from('<I', self.buffer, len(MAGIC))[0]
+        start = len(MAGIC) + 4
+        header = json.loads(bytes(self.buffer[start:start + header_size]).decode('utf-8'))
+        if header['version'] != VERSION:
+            raise ValueError(f"Unsupported snapshot version {header['version']}")
+        self.rows = header['rows']
+        self.id = header.get('id')
+        self.source = header.get('source')
+        self.changes = header.get('changes')
+        self.columns = {entry['name']: entry for entry in header['columns']}
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build an in-memory snapshot from a data frame (used when there is no snapshot file)"""
+        return cls(path=None, buffer=snapshot_bytes(df))
+
+    def __len__(self):
+        return self.rows
+
+    def changes_since(self, previous):
+        """Return the change record from the previous snapshot to this one, or None if it does not apply"""
+        if previous is None or self.changes is None or self.changes['base'] != previous.id:
+            return None
+        return self.changes
+
+    def column(self, name):
+        """Return a zero-copy view of a column: a NumPy array, a Categorical or a StringColumn"""
+        entry = self.columns[name]
+        if entry['kind'] == 'string':
+            offsets = np.frombuffer(self.buffer, dtype=entry['dtype'], count=self.rows + 1,
+                                    offset=entry['offset'])
+            blob = self.buffer[entry['blob_offset']:entry['blob_offset'] + entry['blob_length']]
+            return StringColumn(offsets, blob)
+        values = np.frombuffer(self.buffer, dtype=entry['dtype'], count=self.rows, offset=entry['offset'])
+        if entry['kind'] == 'category':
+            return pd.Categorical.from_codes(values, categories=entry['categories'])
+        return values
+
+    def string_columns(self):
+        """Names of the columns that are only decoded on demand"""
+        return [name for name, entry in self.columns.items() if entry['kind'] == 'string']
+
+    def frame(self):
+        """Return the numeric and category columns as a data frame indexed by snapshot row"""
+        data = {name: self.column(name) for name, entry in self.columns.items() if entry['kind'] != 'string'}
+        return pd.DataFrame(data, index=pd.RangeIndex(self.rows), copy=False)
+
+    def text(self, name, row):
+        """Decode a single string value"""
+        return self.column(name)[row]
+
+    def to_frame(self):
+        """Decode every column, including the strings, into a regular data frame"""
+        df = self.frame().copy()
+        for name in self.string_columns():
+            df[name] = self.column(name).to_list()
+        return df[list(self.columns)]
+
+
+def snapshot_is_fresh(path, source_file):
+    """Return True if the snapshot exists and was built from the current version of source_file"""
+    if not os.path.exists(path):
+        return False
+    try:
+        source = BookSnapshot(path).source
+    except Exception:
+        return False
+    if not os.path.exists(source_file):
+        return source is not None
+    return source == source_info(source_file)
@@ -0,0 +1,177 @@
+#BD code keeps the book data in an SQLite database ('books.db') as an alternative to the CSV files
+#   scraped_books: written by data collection.py --sqlite (one row per UPC, updated on every crawl)
+#   cleaned_books: written by data processing.py --sqlite, queried page by page by Book_Filter_App.py --sqlite
+
+import random
+import sqlite3
+
+import pandas as pd
+
+from book_facets import PRICE_EDGES, RATINGS, price_bucket_labels
+
+DATABASE_FILE = 'books.db'
+SCRAPED_TABLE = 'scraped_books'
+CLEANED_TABLE = 'cleaned_books'
+BATCH_SIZE = 500    # rows per transaction when upserting
+PAGE_SIZE = 100     # books per results page in the application
+SORT_COLUMNS = ('popularity', 'price', 'rating_numeric')
+
+# Indexes used by the filter, sort and facet queries of the application
+CLEANED_INDEXES = {
+    'idx_cleaned_genre_price': '(genre, price)',
+    'idx_cleaned_price': '(price)',
+    'idx_cleaned_rating': '(rating_numeric)',
+    'idx_cleaned_popularity': '(popularity)',
+}
+
+
+def connect(path=DATABASE_FILE, check_same_thread=True):
+    """Open the database and make sure the scraped_books table exists"""
+    conn = sqlite3.connect(path, check_same_thread=check_same_thread)
+    # Readers (the application) are not blocked while a crawl is writing
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {SCRAPED_TABLE} (upc TEXT PRIMARY KEY)")
+    return conn
+
+
+def ensure_columns(conn, table, columns):
+    """Add the columns that do not exist yet (the scrapers may collect new fields over time)"""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for column in columns:
+        if column not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN "{column}"')
+
+
+def upsert_books(conn, books, table=SCRAPED_TABLE, batch_size=BATCH_SIZE):
+    """Insert or update books (dictionaries with a 'upc' key) in batched transactions"""
+    if not books:
+        return 0
+    columns = list(books[0].keys())
+    ensure_columns(conn, table, columns)
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    placeholders = ", ".join("?" for _ in columns)
+    updates = ", ".join(f'"{column}" = excluded."{column}"' for column in columns if column != 'upc')
+    sql = (f"INSERT INTO {table} ({column_list}) VALUES ({placeholders}) "
+           f"ON CONFLICT(upc) DO UPDATE SET {updates}")
+    for start in range(0, len(books), batch_size):
+        batch = books[start:start + batch_size]
+        with conn:
+            conn.executemany(sql, [tuple(book.get(column) for column in columns) for book in batch])
+    return len(books)
+
+
+def read_books(conn, table=SCRAPED_TABLE):
+    """Read a whole table into a data frame"""
+    return pd.read_sql_query(f"SELECT * FROM {table}", conn)
+
+
+def write_cleaned_books(conn, df, table=CLEANED_TABLE):
+    """Replace the cleaned_books table with the data frame and create the query indexes"""
+    df = df.copy()
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(str)
+    with conn:
+        df.to_sql(table, conn, if_exists='replace', index=False)
+        for name, columns in CLEANED_INDEXES.items():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {columns}")
+        conn.execute(f"ANALYZE {table}")
+
+
+def filter_clause(genre='All', min_price=None, max_price=None, min_rating=None, skip=None):
+    """Build the WHERE clause for the filters (skip leaves out one filter, for the facet counts)"""
+    conditions = []
+    params = []
+    if genre and genre != 'All' and skip != 'genre':
+        conditions.append("genre = ?")
+        params.append(genre)
+    if skip != 'price':
+        if min_price is not None:
+            conditions.append("price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            conditions.append("price <= ?")
+            params.append(max_price)
+    if min_rating is not None and skip != 'rating':
+        conditions.append("rating_numeric >= ?")
+        params.append(min_rating)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    return where, params
+
+
+def query_books(conn, genre='All', min_price=None, max_price=None, min_rating=None, sort_by=None,
+                limit=PAGE_SIZE, offset=0, table=CLEANED_TABLE):
+    """Return one page of the books matching the filters, indexed by database row id"""
+    where, params = filter_clause(genre, min_price, max_price, min_rating)
+    order = ""
+    if sort_by:
+        if sort_by not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort_by}")
+        order = f" ORDER BY {sort_by} DESC"
+    sql = f"SELECT rowid AS row_id, * FROM {table}{where}{order} LIMIT ? OFFSET ?"
+    return pd.read_sql_query(sql, conn, params=params + [limit, offset], index_col='row_id')
+
+
+def count_books(conn, genre='All', min_price=None, max_price=None, min_rating=None, table=CLEANED_TABLE):
+    """Return the number of books matching the filters"""
+    where, params = filter_clause(genre, min_price, max_price, min_rating)
+    return conn.execute(f"SELECT COUNT(*) FROM {table}{where}", params).fetchone()[0]
+
+
+def get_book(conn, row_id, table=CLEANED_TABLE):
+    """Return one book by database row id, or None if it does not exist (any more)"""
+    sql = f"SELECT rowid AS row_id, * FROM {table} WHERE rowid = ?"
+    page = pd.read_sql_query(sql, conn, params=[int(row_id)], index_col='row_id')
+    return page.iloc[0] if len(page) else None
+
+
+def random_book(conn, genre='All', table=CLEANED_TABLE):
+    """Return a random book from the genre (uniformly chosen), or None if there is none"""
+    total = count_books(conn, genre, table=table)
+    if total == 0:
+        return None
+    page = query_books(conn, genre, limit=1, offset=random.randrange(total), table=table)
+    return page.iloc[0]
+
+
+def genre_names(conn, table=CLEANED_TABLE):
+    """Return every genre of the table (a full scan: callers keep it until the data changes)"""
+    return [row[0] for row in conn.execute(f"SELECT DISTINCT genre FROM {table} WHERE genre IS NOT NULL")]
+
+
+def facet_counts(conn, genre='All', min_price=None, max_price=None, min_rating=None,
+                 price_edges=PRICE_EDGES, table=CLEANED_TABLE, genres=None):
+    """Same counts as book_facets.FacetCounter.counts, computed by the database
+
+    genres is the list returned by genre_names(), queried again when not given.
+    """
+    if genres is None:
+        genres = genre_names(conn, table)
+
+    where, params = filter_clause(genre, min_price, max_price, min_rating, skip='genre')
+    genre_counts = dict.fromkeys(genres, 0)
+    genre_counts.update(conn.execute(f"SELECT genre, COUNT(*) FROM {table}{where} GROUP BY genre", params))
+
+    where, params = filter_clause(genre, min_price, max_price, min_rating, skip='rating')
+    per_rating = dict(conn.execute(f"SELECT CAST(rating_numeric AS INTEGER), COUNT(*) FROM {table}{where} "
+                                   f"GROUP BY 1", params))
+    at_least = {rating: sum(n for r, n in per_rating.items() if r is not None and r >= rating)
+                for rating in RATINGS}
+
+    where, params = filter_clause(genre, min_price, max_price, min_rating, skip='price')
+    bucket = " + ".join(f"(price >= {edge})" for edge in price_edges)
+    labels = price_bucket_labels(price_edges)
+    per_bucket = dict(conn.execute(f"SELECT {bucket}, COUNT(*) FROM {table}{where} GROUP BY 1", params))
+    price_counts = {label: per_bucket.get(i, 0) for i, label in enumerate(labels)}
+
+    return {
+        'total': count_books(conn, genre, min_price, max_price, min_rating, table=table),
+        'genre': dict(sorted(genre_counts.items())),
+        'rating': at_least,
+        'price': price_counts,
+    }
+
+
+def data_version(conn):
+    """Return a number that changes whenever another connection commits to the database"""
+    return conn.execute("PRAGMA data_version").fetchone()[0]
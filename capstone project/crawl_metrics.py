@@ -0,0 +1,174 @@
+#CM code is used by the scrapers and generates 1 file per run: crawl_metrics.json (or crawl_metrics.prom)
+
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Histogram bucket upper bounds in seconds (Prometheus style, +Inf is implicit)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class StageHistogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Cumulative latency histogram for one crawl stage"""
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, seconds):
+        """Record a single duration"""
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+
+    def to_dict(self):
+        """Return the histogram as a plain dictionary"""
+        return {
+            'count': self.count,
+            'sum': round(self.total, 6),
+            'mean': round(self.total / self.count, 6) if self.count else 0.0,
+            'min': round(self.min, 6) if self.min is not None else None,
+            'max': round(self.max, 6) if self.max is not None else None,
+            'buckets': {str(bound): n for bound, n in zip(self.buckets, self.bucket_counts)},
+        }
+
+
+class CrawlMetrics:
+    def __init__(self, name='crawl'):
+        """Collect per-stage timings, throughput and error counts for one crawl run"""
+        self.name = name
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.end = None
+        self.stages = {}
+        self.errors = {}
+        self.pages = 0
+        self.items = 0
+        self.failed_items = 0
+        self.failed_pages = 0
+        self.bytes_downloaded = 0
+
+    @contextmanager
+    def time_stage(self, stage):
+        """Time the enclosed block and record it under the given stage name"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record_error(stage)
+            # Counted once: the handler that catches it further up calls record_page_failure(e)
+            e.crawl_stage = stage
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        """Record a duration measured elsewhere (e.g. response.elapsed)"""
+        if stage not in self.stages:
+            self.stages[stage] = StageHistogram()
+        self.stages[stage].observe(seconds)
+
+    def record_page(self, response):
+        """Count a downloaded page and its size"""
+        self.pages += 1
+        self.bytes_downloaded += len(response.content)
+        # requests measures the time until the response headers were parsed
+        self.observe('time_to_first_byte', response.elapsed.total_seconds())
+
+    def record_item(self):
+        """Count a successfully extracted item"""
+        self.items += 1
+
+    def record_failure(self):
+        """Count an item that could not be extracted"""
+        self.failed_items += 1
+
+    def record_error(self, stage):
+        """Count a failure in the given stage"""
+        self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    def record_page_failure(self, error, stage='page'):
+        """Count a page whose books could not be scraped, and its error unless time_stage counted it"""
+        self.failed_pages += 1
+        if getattr(error, 'crawl_stage', None) is None:
+            self.record_error(stage)
+
+    def finish(self):
+        """Mark the end of the run"""
+        self.end = time.perf_counter()
+
+    def summary(self):
+        """Return all metrics as a dictionary"""
+        elapsed = (self.end or time.perf_counter()) - self.start
+        # A failed page counts as one failed attempt (its books were never tried)
+        attempts = self.items + self.failed_items + self.failed_pages
+        return {
+            'name': self.name,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'elapsed_seconds': round(elapsed, 3),
+            'pages': self.pages,
+            'items': self.items,
+            'failed_items': self.failed_items,
+            'failed_pages': self.failed_pages,
+            'bytes_downloaded': self.bytes_downloaded,
+            'pages_per_second': round(self.pages / elapsed, 3) if elapsed else 0.0,
+            'bytes_per_second': round(self.bytes_downloaded / elapsed, 1) if elapsed else 0.0,
+            'errors': dict(self.errors),
+            'error_rate': round((self.failed_items + self.failed_pages) / attempts, 4) if attempts else 0.0,
+            'stages': {stage: hist.to_dict() for stage, hist in self.stages.items()},
+        }
+
+    def to_prometheus(self):
+        """Return the metrics in the Prometheus text exposition format"""
+        s = self.summary()
+        prefix = f"{self.name}_"
+        lines = []
+
+        def gauge(metric, value, help_text):
+            lines.append(f"# HELP {prefix}{metric} {help_text}")
+            lines.append(f"# TYPE {prefix}{metric} gauge")
+            lines.append(f"{prefix}{metric} {value}")
+
+        gauge('elapsed_seconds', s['elapsed_seconds'], 'Wall clock duration of the run')
+        gauge('pages_total', s['pages'], 'Pages downloaded')
+        gauge('items_total', s['items'], 'Items extracted successfully')
+        gauge('failed_items_total', s['failed_items'], 'Items that could not be extracted')
+        gauge('failed_pages_total', s['failed_pages'], 'Pages whose items could not be scraped')
+        gauge('bytes_downloaded_total', s['bytes_downloaded'], 'Response bytes downloaded')
+        gauge('pages_per_second', s['pages_per_second'], 'Download throughput in pages')
+        gauge('bytes_per_second', s['bytes_per_second'], 'Download throughput in bytes')
+        gauge('error_rate', s['error_rate'], 'Failed items and pages divided by attempted items and pages')
+
+        lines.append(f"# HELP {prefix}errors_total Errors per stage")
+        lines.append(f"# TYPE {prefix}errors_total counter")
+        for stage, n in s['errors'].items():
+            lines.append(f'{prefix}errors_total{{stage="{stage}"}} {n}')
+
+        lines.append(f"# HELP {prefix}stage_seconds Duration of each crawl stage")
+        lines.append(f"# TYPE {prefix}stage_seconds histogram")
+        for stage, hist in self.stages.items():
+            for bound, n in zip(hist.buckets, hist.bucket_counts):
+                lines.append(f'{prefix}stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {n}')
+            lines.append(f'{prefix}stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist.count}')
+            lines.append(f'{prefix}stage_seconds_sum{{stage="{stage}"}} {round(hist.total, 6)}')
+            lines.append(f'{prefix}stage_seconds_count{{stage="{stage}"}} {hist.count}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, filename='crawl_metrics.json'):
+        """Write the metrics file; a .prom extension selects the Prometheus format"""
+        self.finish()
+        with open(filename, 'w', encoding='utf-8') as f:
+            if filename.endswith('.prom'):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.summary(), f, indent=4)
+        print(f"Crawl metrics saved to {filename}")
+        return filename
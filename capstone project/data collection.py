@@ -1,13 +1,69 @@
-#DC code generates 1 file: scraped_books.csv
+#DC code generates 2 files: scraped_books.csv and book_history.db (prices, stock and availability of every crawl)
+#and downloads the book covers into the 'covers' folder (see book_covers.py)
+#With --sqlite [books.db] the books are also upserted (by UPC) into the scraped_books table of the database
 
 import requests
 from bs4 import BeautifulSoup
 import pandas as pd
-import re
+import argparse
 from time import sleep
+from crawl_metrics import CrawlMetrics
+import book_store
+import book_history
+from book_covers import CoverStore, COVERS_DIR
+from book_enrichment import enrich_books
 
-def scrape_books():
+def extract_listing_book(book):
+    """Extract the listing fields from an article.product_pod element"""
+    title = book.find('h3').find('a')['title']
+    price = book.find('p', class_='price_color').text.strip()
+    rating = book.find('p', class_='star-rating')['class'][1]
+    availability = book.find('p', class_='instock availability').text.strip()
+    
+    # Get book page URL
+    book_url = book.find('h3').find('a')['href']
+    if not book_url.startswith('http'):
+        book_url = "http://books.toscrape.com/catalogue/" + book_url.lstrip('/')
+    
+    return {'title': title, 'price': price, 'rating': rating,
+            'availability': availability, 'book_url': book_url,
+            'cover_url': extract_cover_url(book)}
+
+def extract_cover_url(book):
+    """Return the absolute URL of the cover image of an article.product_pod element"""
+    image = book.find('img', class_='thumbnail')
+    if image is None:
+        return None
+    cover_url = image['src']
+    if not cover_url.startswith('http'):
+        cover_url = "http://books.toscrape.com/" + cover_url.replace('../', '')
+    return cover_url
+
+def extract_book_details(book_soup):
+    """Extract the genre and the product information table from a book page"""
+    # Get genre
+    breadcrumbs = book_soup.find('ul', class_='breadcrumb')
+    genre = breadcrumbs.find_all('li')[2].text.strip() if breadcrumbs else 'Unknown'
+    
+    # Get product info
+    product_info = book_soup.find('table', class_='table table-striped')
+    info_dict = {}
+    if product_info:
+        rows = product_info.find_all('tr')
+        for row in rows:
+            header = row.find('th').text.strip()
+            value = row.find('td').text.strip()
+            info_dict[header] = value
+    
+    return genre, info_dict
+
+def scrape_books(metrics_file='crawl_metrics.json', db_file=None, history_file=book_history.HISTORY_FILE,
+                 covers_dir=COVERS_DIR):
     print("Starting book scraping...")
+    metrics = CrawlMetrics('book_scraper')
+    covers = CoverStore(covers_dir) if covers_dir else None
+    conn = book_store.connect(db_file) if db_file else None
+    pending = []  # books not yet written to the database
     books = []
     base_url = "http://books.toscrape.com/catalogue/page-{}.html"
     books_scraped = 0
@@ -17,54 +73,55 @@ def scrape_books():
         try:
             url = base_url.format(page)
             print(f"Accessing page {page}...")
-            response = requests.get(url)
-            response.raise_for_status()  # Raise an error for bad status codes
-            soup = BeautifulSoup(response.content, 'html.parser')
+            with metrics.time_stage('fetch_listing'):
+                response = requests.get(url)
+                response.raise_for_status()  # Raise an error for bad status codes
+            metrics.record_page(response)
             
-            book_elements = soup.find_all('article', class_='product_pod')
+            with metrics.time_stage('parse_listing'):
+                soup = BeautifulSoup(response.content, 'html.parser')
+                book_elements = soup.find_all('article', class_='product_pod')
             if not book_elements:
                 print(f"No books found on page {page}")
                 break
+            
+            # Download the covers of the page in the background while the book pages are scraped
+            if covers is not None:
+                for book in book_elements[:10 - books_scraped]:
+                    cover_url = extract_cover_url(book)
+                    if cover_url:
+                        covers.fetch(cover_url)
                 
-            for book in book_elements:
+            for position, book in enumerate(book_elements, 1):
                 if books_scraped >= 10:
                     break
                     
                 try:
-                    title = book.find('h3').find('a')['title']
+                    with metrics.time_stage('extract_listing'):
+                        listing = extract_listing_book(book)
+                    title = listing['title']
+                    price = listing['price']
+                    rating = listing['rating']
+                    availability = listing['availability']
                     print(f"Scraping book: {title}")
                     
-                    price = book.find('p', class_='price_color').text.strip()
-                    rating = book.find('p', class_='star-rating')['class'][1]
-                    availability = book.find('p', class_='instock availability').text.strip()
+                    with metrics.time_stage('fetch_detail'):
+                        book_response = requests.get(listing['book_url'])
+                        book_response.raise_for_status()
+                    metrics.record_page(book_response)
                     
-                    # Get book page URL
-                    book_url = book.find('h3').find('a')['href']
-                    if not book_url.startswith('http'):
-                        book_url = "http://books.toscrape.com/catalogue/" + book_url.lstrip('/')
+                    with metrics.time_stage('parse_detail'):
+                        book_soup = BeautifulSoup(book_response.content, 'html.parser')
                     
-                    book_response = requests.get(book_url)
-                    book_response.raise_for_status()
-                    book_soup = BeautifulSoup(book_response.content, 'html.parser')
-                    
-                    # Get genre
-                    breadcrumbs = book_soup.find('ul', class_='breadcrumb')
-                    genre = breadcrumbs.find_all('li')[2].text.strip() if breadcrumbs else 'Unknown'
-                    
-                    # Get product info
-                    product_info = book_soup.find('table', class_='table table-striped')
-                    info_dict = {}
-                    if product_info:
-                        rows = product_info.find_all('tr')
-                        for row in rows:
-                            header = row.find('th').text.strip()
-                            value = row.find('td').text.strip()
-                            info_dict[header] = value
+                    with metrics.time_stage('extract_detail'):
+                        genre, info_dict = extract_book_details(book_soup)
                     
                     # Extract specific information
                     upc = info_dict.get('UPC', 'N/A')
                     author = info_dict.get('Author', 'Unknown')
                     publication_year = info_dict.get('Published', 'N/A')
+                    # e.g. 'In stock (22 available)'; the listing only says 'In stock'
+                    detail_availability = info_dict.get('Availability', '')
                     
                     if publication_year != 'N/A':
                         try:
@@ -72,19 +129,11 @@ def scrape_books():
                         except:
                             publication_year = 'N/A'
                     
-                    # Calculate ranking and popularity
-                    ranking = (page - 1) * 20 + list(book_elements).index(book) + 1
-                    
-                    rating_map = {'One': 1, 'Two': 2, 'Three': 3, 'Four': 4, 'Five': 5}
-                    rating_numeric = rating_map.get(rating, 0)
-                    
-                    try:
-                        match = re.search(r'\d+', availability)
-                        availability_number = int(match.group()) if match else 0
-                    except:
-                        availability_number = 0
-                    
-                    popularity = (rating_numeric * 10) + (20 - min(availability_number, 20))
+                    # Hash of the cover in the covers folder (the download was started with the page)
+                    cover = None
+                    if covers is not None:
+                        with metrics.time_stage('fetch_cover'):
+                            cover = covers.cover(listing['cover_url'])
                     
                     books.append({
                         'title': title,
@@ -95,29 +144,66 @@ def scrape_books():
                         'availability': availability,
                         'upc': upc,
                         'publication_year': publication_year,
-                        'ranking': ranking,
-                        'popularity': popularity
+                        'detail_availability': detail_availability,
+                        'page': page,
+                        'position': position,
+                        'cover': cover
                     })
                     
+                    # Write to the database in batches, one transaction per batch
+                    if conn is not None:
+                        pending.append(books[-1])
+                        if len(pending) >= book_store.BATCH_SIZE:
+                            with metrics.time_stage('store'):
+                                batch = enrich_books(pd.DataFrame(pending))
+                                book_store.upsert_books(conn, batch.to_dict('records'))
+                            pending = []
+                    
                     books_scraped += 1
+                    metrics.record_item()
                     print(f"Successfully scraped book {books_scraped}/10")
-                    sleep(1)
+                    with metrics.time_stage('sleep'):
+                        sleep(1)
                     
                 except Exception as e:
+                    metrics.record_failure()
                     print(f"Error scraping individual book: {str(e)}")
                     continue
                     
         except Exception as e:
+            metrics.record_page_failure(e)
             print(f"Error on page {page}: {str(e)}")
             break
             
         page += 1
     
+    if covers is not None:
+        covers.close()
+        print(f"Covers: {covers.downloaded} downloaded, {covers.failed} failed (saved in {covers_dir})")
+    
+    metrics.export(metrics_file)
+    
+    if conn is not None:
+        if pending:
+            book_store.upsert_books(conn, enrich_books(pd.DataFrame(pending)).to_dict('records'))
+        conn.close()
+        print(f"Books saved to the {book_store.SCRAPED_TABLE} table of {db_file}")
+    
     if books:
         print("Creating DataFrame and saving to CSV...")
-        df = pd.DataFrame(books)
+        # Ranking, rating_numeric, stock and popularity are computed for all books at once
+        df = enrich_books(pd.DataFrame(books))
         df.to_csv('scraped_books.csv', index=False)
         print(f"Successfully scraped {len(books)} books and saved to scraped_books.csv")
+        
+        # Keep what changed since the previous crawl (scraped_books.csv only has the latest prices)
+        if history_file:
+            # After a failed book or page the missing books may still be listed: they are not marked
+            complete = metrics.failed_items == 0 and not metrics.errors
+            changed = book_history.record_crawl(df, history_file, complete=complete)
+            print(f"{changed} new or changed books recorded in {history_file}")
+            if not complete:
+                print("The crawl had errors: books that were not scraped are not marked as no longer listed")
         print("\nFirst few rows of the data:")
         print(df.head())
         return df
@@ -126,4 +212,8 @@ def scrape_books():
         return None
 
 if __name__ == "__main__":
-    scrape_books()
+    parser = argparse.ArgumentParser(description="Scrape books from books.toscrape.com")
+    parser.add_argument('--sqlite', nargs='?', const=book_store.DATABASE_FILE, metavar='DB_FILE',
+                        help="also save the books in an SQLite database (default: %(const)s)")
+    args = parser.parse_args()
+    scrape_books(db_file=args.sqlite)
@@ -1,16 +1,31 @@
-#DP code generates 2 files: 
+#DP code generates 3 files: 
 #1.book_analysis.xslx
 #2.cleaned_books.csv
+#3.cleaned_books.snap (binary snapshot memory-mapped by Book_Filter_App.py, see book_snapshot.py)
+#With --sqlite [books.db] the data is read from the scraped_books table and also written to cleaned_books
+#The trend sections of the insights are read from book_history.db (written by data collection.py)
 
 import pandas as pd
 import numpy as np
+import argparse
+import os
 from datetime import datetime
+import book_store
+import book_history
+import book_snapshot
 
-def clean_book_data(csv_file='scraped_books.csv'):
+def clean_book_data(csv_file='scraped_books.csv', output_file='cleaned_books.csv',
+                    report_file='book_analysis.xlsx', db_file=None, snapshot_file=book_snapshot.SNAPSHOT_FILE):
     try:
-        # Read the CSV file
-        print("Reading the CSV file...")
-        df = pd.read_csv(csv_file)
+        if db_file:
+            # Read the scraped books from the database
+            print(f"Reading the {book_store.SCRAPED_TABLE} table of {db_file}...")
+            conn = book_store.connect(db_file)
+            df = book_store.read_books(conn)
+        else:
+            # Read the CSV file
+            print("Reading the CSV file...")
+            df = pd.read_csv(csv_file)
         
         # Display initial information about the dataset
         print("\nInitial dataset information:")
@@ -65,13 +80,29 @@ def clean_book_data(csv_file='scraped_books.csv'):
         print(genre_price)
         
         # Save the cleaned data
-        output_file = 'cleaned_books.csv'
         df.to_csv(output_file, index=False)
         print(f"\nCleaned data saved to {output_file}")
         
-        # Create Excel file with multiple sheets for different analyses
+        # Save the snapshot of scraped_books.csv that Book_Filter_App.py maps at startup (with the cleaning
+        # rules of the application, which keeps the duplicate titles); written once here for all instances
+        if snapshot_file is not None and os.path.exists(csv_file):
+            rows, changes = book_snapshot.build_snapshot(csv_file, snapshot_file)
+            print(f"Binary snapshot of {rows} books saved to {snapshot_file}")
+            if changes is not None:
+                print(f"Since the previous snapshot: {len(changes['inserted'])} new, {len(changes['updated'])} changed and "
+                      f"{len(changes['deleted'])} removed books")
+        
+        # Save the cleaned data to the database, with the indexes used by Book_Filter_App.py --sqlite
+        if db_file:
+            book_store.write_cleaned_books(conn, df)
+            conn.close()
+            print(f"Cleaned data saved to the {book_store.CLEANED_TABLE} table of {db_file}")
+        
+        # Create Excel file with multiple sheets for different analyses (skipped when report_file is None)
+        if report_file is None:
+            return df
         print("\nCreating Excel report...")
-        with pd.ExcelWriter('book_analysis.xlsx') as writer:
+        with pd.ExcelWriter(report_file) as writer:
             # Main data sheet
             df.to_excel(writer, sheet_name='Clean_Data', index=False)
             
@@ -96,7 +127,7 @@ def clean_book_data(csv_file='scraped_books.csv'):
             df.nlargest(10, 'popularity')[['title', 'author', 'genre', 'price', 'rating', 'popularity']].to_excel(
                 writer, sheet_name='Top_Books')
         
-        print("Excel report created: book_analysis.xlsx")
+        print(f"Excel report created: {report_file}")
         
         return df
         
@@ -107,7 +138,7 @@ def clean_book_data(csv_file='scraped_books.csv'):
         print(f"An error occurred: {str(e)}")
         return None
 
-def generate_insights(df):
+def generate_insights(df, history_file=book_history.HISTORY_FILE):
     "Generate additional insights from the cleaned data"
     if df is not None:
         print("\nGenerating Additional Insights...")
@@ -139,10 +170,43 @@ def generate_insights(df):
         print("\nAverage Price by Rating:")
         rating_price = df.groupby('rating')['price'].agg(['mean', 'count']).round(2)
         print(rating_price)
+        
+        # Trends across crawls (recorded by data collection.py)
+        if history_file and os.path.exists(history_file):
+            generate_trends(df, history_file)
+
+def generate_trends(df, history_file=book_history.HISTORY_FILE):
+    "Print the price, stock and availability trends from the crawl history"
+    conn = book_history.connect(history_file)
+    try:
+        print("\nChanges per Crawl:")
+        print(book_history.crawl_summary(conn))
+        
+        print("\nBooks Whose Price Dropped Since Last Week:")
+        drops = book_history.price_drops(conn)
+        if drops.empty:
+            print("No price drops")
+        else:
+            titles = df.drop_duplicates('upc').set_index('upc')['title']
+            drops.insert(1, 'title', drops['upc'].map(titles))
+            print(drops.head(10).to_string(index=False))
+        
+        # Price history of the book with the largest drop, as an example
+        if not drops.empty:
+            upc = drops['upc'].iloc[0]
+            print(f"\nPrice History of UPC {upc}:")
+            print(book_history.price_history(conn, upc).to_string(index=False))
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean and analyse the scraped book data")
+    parser.add_argument('--sqlite', nargs='?', const=book_store.DATABASE_FILE, metavar='DB_FILE',
+                        help="read from and write to an SQLite database instead of the CSV input (default: %(const)s)")
+    args = parser.parse_args()
+    
     # Clean and analyze the data
-    cleaned_df = clean_book_data()
+    cleaned_df = clean_book_data(db_file=args.sqlite)
     
     # Generate additional insights if data cleaning was successful
     if cleaned_df is not None:
@@ -4,10 +4,16 @@ import pandas as pd
 import time
 import random
 import json
+import os
+import sys
 from datetime import datetime
 
+# crawl_metrics.py lives two folders up, next to the main scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from crawl_metrics import CrawlMetrics
+
 class BookScraper:
-    def __init__(self):
+    def __init__(self, metrics=None):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -23,6 +29,7 @@ class BookScraper:
             'young_adult': 'Y',
             'middle_grade': 'M'
         }
+        self.metrics = metrics or CrawlMetrics('bestseller_scraper')
 
     def get_book_details(self, book_element, rank, category):
         """Extract book information from a single book element"""
@@ -75,23 +82,33 @@ class BookScraper:
         
         try:
             print(f"Fetching {url}")
-            time.sleep(random.uniform(2, 4))  # Polite delay
+            with self.metrics.time_stage('sleep'):
+                time.sleep(random.uniform(2, 4))  # Polite delay
             
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
+            with self.metrics.time_stage('fetch'):
+                response = requests.get(url, headers=self.headers)
+                response.raise_for_status()
+            self.metrics.record_page(response)
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            book_elements = soup.find_all('div', class_='product-list-item')
+            with self.metrics.time_stage('parse'):
+                soup = BeautifulSoup(response.content, 'html.parser')
+                book_elements = soup.find_all('div', class_='product-list-item')
             
             print(f"Found {len(book_elements)} books in {category_name}")
             
             for rank, book in enumerate(book_elements, 1):
-                book_data = self.get_book_details(book, rank, category_name)
+                with self.metrics.time_stage('extract'):
+                    book_data = self.get_book_details(book, rank, category_name)
                 if book_data:
                     books_data.append(book_data)
-                time.sleep(random.uniform(0.5, 1))
+                    self.metrics.record_item()
+                else:
+                    self.metrics.record_failure()
+                with self.metrics.time_stage('sleep'):
+                    time.sleep(random.uniform(0.5, 1))
 
         except Exception as e:
+            self.metrics.record_page_failure(e, 'category')
             print(f"Error scraping {category_name}: {e}")
 
         return books_data
@@ -139,6 +156,7 @@ def main():
     
     scraper = BookScraper()
     books_data = scraper.scrape_all_categories()
+    scraper.metrics.export('crawl_metrics.json')
     
     if books_data:
         print(f"\nTotal books collected: {len(books_data)}")
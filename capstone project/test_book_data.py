@@ -0,0 +1,451 @@
+#Tests of the data files written by the scripts (run with: python -m pytest test_book_data.py)
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Book_Filter_App import BookFilterApp, moved_row, moved_rows
+import book_enrichment
+from book_facets import FacetCounter
+from book_history import NOT_LISTED, connect, crawl_summary, price_drops, price_history, record_crawl
+from book_similarity import BookSimilarityIndex
+from book_snapshot import (BookSnapshot, align_to_snapshot, build_snapshot, save_snapshot, snapshot_bytes,
+                           snapshot_is_fresh)
+import book_store
+from crawl_metrics import CrawlMetrics
+
+
+def make_books(n=6):
+    """Small cleaned catalogue in the layout used by Book_Filter_App.py"""
+    return pd.DataFrame({
+        'title': [f"Book {i}" for i in range(n)],
+        'author': ['Unknown'] * n,
+        'genre': pd.Categorical(['Poetry', 'Mystery', 'Travel'] * (n // 3) + ['Poetry'] * (n % 3)),
+        'price': np.arange(n, dtype=float) + 10.5,
+        'rating': ['One', 'Two', 'Three', 'Four', 'Five', 'One'][:n] + ['Five'] * max(n - 6, 0),
+        'upc': [f"upc{i:04d}" for i in range(n)],
+        'rating_numeric': np.arange(n) % 5 + 1,
+        'popularity': np.arange(n, dtype=np.int64) * 10,
+        'is_recent': np.arange(n) % 2 == 0,
+    })
+
+
+def test_snapshot_round_trip():
+    df = make_books()
+    df.loc[2, 'title'] = "Ünïcode – title"
+    snapshot = BookSnapshot(buffer=snapshot_bytes(df))
+
+    assert len(snapshot) == len(df)
+    assert snapshot.string_columns() == ['title', 'author', 'rating', 'upc']
+    pd.testing.assert_frame_equal(snapshot.to_frame(), df)
+    assert snapshot.text('title', 2) == "Ünïcode – title"
+    assert snapshot.column('upc').raw([0, 5]) == [b'upc0000', b'upc0005']
+
+    frame = snapshot.frame()
+    assert list(frame.columns) == ['genre', 'price', 'rating_numeric', 'popularity', 'is_recent']
+    assert list(frame['genre'].cat.categories) == list(df['genre'].cat.categories)
+
+
+def test_snapshot_file_is_memory_mapped(tmp_path):
+    df = make_books()
+    path = str(tmp_path / 'books.snap')
+    save_snapshot(df, path)
+    snapshot = BookSnapshot(path)
+
+    # The numeric columns are views of the mapped file, not copies
+    assert np.shares_memory(snapshot.frame()['price'].to_numpy(), np.frombuffer(snapshot.buffer, dtype=np.uint8))
+    pd.testing.assert_frame_equal(snapshot.to_frame(), df)
+    assert [p.name for p in tmp_path.iterdir()] == ['books.snap']
+
+
+def test_snapshot_is_only_fresh_for_its_source(tmp_path):
+    csv_file = tmp_path / 'scraped_books.csv'
+    csv_file.write_text("title\nBook 0\n")
+    path = str(tmp_path / 'books.snap')
+
+    # A snapshot without a recorded source (or from another file) is never used
+    save_snapshot(make_books(), path)
+    assert not snapshot_is_fresh(path, str(csv_file))
+
+    save_snapshot(make_books(), path, source_file=str(csv_file))
+    assert snapshot_is_fresh(path, str(csv_file))
+    other_file = tmp_path / 'other.csv'
+    other_file.write_text("title\nBook 0\n")
+    assert not snapshot_is_fresh(path, str(other_file))
+
+    csv_file.write_text("title\nBook 0\nBook 1\n")
+    assert not snapshot_is_fresh(path, str(csv_file))
+
+
+def write_scraped(df, csv_file):
+    """Write books in the layout of scraped_books.csv (prices as text, no derived rating)"""
+    scraped = df.drop(columns=['rating_numeric'])
+    scraped['price'] = [f"£{price:.2f}" for price in scraped['price']]
+    scraped.to_csv(csv_file, index=False)
+
+
+def test_build_snapshot_matches_the_application_cleaning(tmp_path):
+    csv_file = str(tmp_path / 'scraped_books.csv')
+    books = make_books()
+    books.loc[3, 'rating'] = 'Unknown'
+    write_scraped(books, csv_file)
+    path = str(tmp_path / 'books.snap')
+
+    assert build_snapshot(csv_file, path) == (5, None)
+    assert snapshot_is_fresh(path, csv_file)
+    # The application reads the CSV itself (no snapshot yet) with the same cleaning
+    app = BookFilterApp.__new__(BookFilterApp)
+    expected = app.load_and_clean_data(csv_file).reset_index(drop=True)
+    pd.testing.assert_frame_equal(BookSnapshot(path).to_frame(), expected)
+
+
+def new_version(df):
+    """Update book 1, delete book 2 and insert two books, one of them in a new genre"""
+    new = df.copy()
+    new.loc[1, 'price'] = 99.0
+    new = new.drop(index=2)
+    inserted = make_books(2)
+    inserted['upc'] = ['upc9000', 'upc9001']
+    inserted['title'] = ['New Book', 'Another New Book']
+    inserted['genre'] = ['Science', 'Poetry']
+    new = pd.concat([new, inserted], ignore_index=True)
+    new['genre'] = new['genre'].astype(str).astype('category')
+    return new
+
+
+def aligned_version(old, new):
+    """Snapshot of old, and the snapshot data processing.py writes for new after it"""
+    base = BookSnapshot.from_frame(old)
+    df, changes = align_to_snapshot(new, base)
+    return base, BookSnapshot(buffer=snapshot_bytes(df, changes=changes))
+
+
+def test_new_snapshot_keeps_the_rows_of_the_previous_one():
+    old = make_books(12)
+    base, snapshot = aligned_version(old, new_version(old))
+    changes = snapshot.changes_since(base)
+
+    # The first new book takes the row of the removed one, the second one goes after the last row
+    expected = [f"upc{i:04d}" for i in range(12)] + ['upc9001']
+    expected[2] = 'upc9000'
+    assert snapshot.column('upc').to_list() == expected
+    assert changes['inserted'] == [2, 12]
+    assert changes['updated'] == [1]
+    assert changes['deleted'] == [2]
+    assert changes['moved'] == []
+    assert changes['rows'] == [1, 2, 12]
+    assert moved_row(2, changes) is None
+    assert moved_row(5, changes) == 5
+    # The genre codes of the previous snapshot stay valid
+    assert list(snapshot.frame()['genre'].cat.categories) == ['Mystery', 'Poetry', 'Travel', 'Science']
+    # A change record only applies to the snapshot it was made from
+    assert snapshot.changes_since(BookSnapshot.from_frame(old)) is None
+
+
+def test_smaller_snapshot_moves_the_last_books_into_the_holes():
+    old = make_books(12)
+    new = old.drop(index=[1, 4])
+    base, snapshot = aligned_version(old, new)
+    changes = snapshot.changes_since(base)
+
+    assert changes['moved'] == [[10, 1], [11, 4]]
+    assert changes['rows'] == [1, 4]
+    assert changes['deleted'] == [1, 4]
+    assert moved_rows([0, 1, 10, 11], changes) == [0, None, 1, 4]
+    pd.testing.assert_frame_equal(snapshot.to_frame().sort_values('upc').reset_index(drop=True),
+                                  new.reset_index(drop=True))
+
+
+def test_align_to_snapshot_finds_text_changes():
+    old = make_books(12)
+    new = old.copy()
+    new.loc[0, 'title'] = 'Renamed'
+    base, snapshot = aligned_version(old, new)
+    assert snapshot.changes_since(base)['updated'] == [0]
+
+
+def test_align_to_snapshot_without_change_record():
+    old = make_books(12)
+    base = BookSnapshot.from_frame(old)
+    # Duplicate UPCs: the books cannot be matched
+    new = old.copy()
+    new.loc[1, 'upc'] = new.loc[0, 'upc']
+    assert align_to_snapshot(new, base)[1] is None
+    # Most books changed: the snapshot is written from scratch
+    new = old.copy()
+    new['price'] += 1
+    assert align_to_snapshot(new, base)[1] is None
+
+
+def test_facet_counter_patch_matches_rebuild():
+    old = make_books(12)
+    for new in (new_version(old), old.drop(index=[1, 4])):
+        base, snapshot = aligned_version(old, new)
+        patched = FacetCounter(base.frame())
+        patched.patch(snapshot.frame(), snapshot.changes)
+        rebuilt = FacetCounter(snapshot.frame())
+        for filters in [('All', None, None, None), ('Science', None, None, None), ('Poetry', 12, 60, 2)]:
+            assert patched.counts(*filters) == rebuilt.counts(*filters)
+
+
+def test_similarity_patch_matches_rebuild():
+    old = make_books(12)
+    for new in (new_version(old), old.drop(index=[1, 4])):
+        base, snapshot = aligned_version(old, new)
+        patched = BookSimilarityIndex(base.frame(), base.column('title').to_list())
+        patched.patch(snapshot.frame(), snapshot.column('title').take(snapshot.changes['rows']), snapshot.changes)
+        # Same numeric scaling as the patched index, which keeps the one of its full build
+        rebuilt = BookSimilarityIndex(snapshot.frame(), snapshot.column('title').to_list(),
+                                      scaling=(patched.numeric_mean, patched.numeric_scale))
+        assert len(patched) == len(snapshot)
+        for row in range(len(snapshot)):
+            np.testing.assert_allclose(patched.scores([row]), rebuilt.scores([row]), rtol=1e-5)
+
+
+def test_build_snapshot_records_the_changes(tmp_path):
+    csv_file = str(tmp_path / 'scraped_books.csv')
+    path = str(tmp_path / 'books.snap')
+    books = make_books(12)
+    write_scraped(books, csv_file)
+    build_snapshot(csv_file, path)
+    first = BookSnapshot(path)
+
+    books.loc[3, 'price'] = 5.0
+    write_scraped(books, csv_file)
+    rows, changes = build_snapshot(csv_file, path)
+    assert rows == 12
+    assert BookSnapshot(path).changes_since(first) == changes
+    assert changes['updated'] == [3]
+
+
+def crawl(prices, stock=None, availability='In stock'):
+    """Scraped books in the layout of scraped_books.csv, one per UPC (5 copies of each in stock by default)"""
+    stock = stock or {}
+    return pd.DataFrame({
+        'upc': list(prices),
+        'price': [f"£{price:.2f}" for price in prices.values()],
+        'availability': availability,
+        'stock': [stock.get(upc, 5) for upc in prices],
+    })
+
+
+def test_price_history_over_several_crawls(tmp_path):
+    path = str(tmp_path / 'history.db')
+    now = datetime.now()
+    assert record_crawl(crawl({'a': 10.0, 'b': 20.0, 'c': 30.0}), path, now - timedelta(days=10)) == 3
+    # Nothing changed: nothing is stored
+    assert record_crawl(crawl({'a': 10.0, 'b': 20.0, 'c': 30.0}), path, now - timedelta(days=9)) == 0
+    # a is cheaper, b is more expensive, c is gone
+    assert record_crawl(crawl({'a': 8.5, 'b': 21.0}), path, now - timedelta(days=1)) == 3
+
+    conn = connect(path)
+    try:
+        history = price_history(conn, 'a')
+        assert list(history['price']) == [10.0, 8.5]
+        assert list(history['availability']) == ['In stock', 'In stock']
+        history = price_history(conn, 'c')
+        assert list(history['price']) == [30.0, 30.0]
+        assert list(history['stock']) == [5, 0]
+        assert list(history['availability']) == ['In stock', NOT_LISTED]
+
+        drops = price_drops(conn, since=timedelta(days=7))
+        assert list(drops['upc']) == ['a']
+        assert list(drops['change']) == [-1.5]
+    finally:
+        conn.close()
+
+
+def test_incomplete_crawl_does_not_unlist_books(tmp_path):
+    path = str(tmp_path / 'history.db')
+    now = datetime.now()
+    record_crawl(crawl({'a': 10.0, 'b': 20.0}), path, now - timedelta(days=2))
+    # The page of b could not be fetched
+    assert record_crawl(crawl({'a': 9.0}), path, now - timedelta(days=1), complete=False) == 1
+    record_crawl(crawl({'a': 9.0, 'b': 20.0}), path, now)
+
+    conn = connect(path)
+    try:
+        assert list(price_history(conn, 'b')['availability']) == ['In stock']
+    finally:
+        conn.close()
+
+
+def test_stock_history(tmp_path):
+    path = str(tmp_path / 'history.db')
+    now = datetime.now()
+    record_crawl(crawl({'a': 10.0, 'b': 20.0}), path, now - timedelta(days=3))
+    # Only the stock of a changed: one change, with the difference of the stock
+    assert record_crawl(crawl({'a': 10.0, 'b': 20.0}, stock={'a': 2}), path, now - timedelta(days=2)) == 1
+    record_crawl(crawl({'a': 10.0, 'b': 20.0}, stock={'a': 7}), path, now - timedelta(days=1))
+
+    conn = connect(path)
+    try:
+        assert conn.execute("SELECT stock_delta FROM changes WHERE upc_id = 1 ORDER BY crawl_id").fetchall() == \
+            [(5,), (-3,), (5,)]
+        assert list(price_history(conn, 'a')['stock']) == [5, 2, 7]
+        assert list(crawl_summary(conn)['stock_changes']) == [0, 1, 1]
+    finally:
+        conn.close()
+
+
+def test_history_without_stock_column(tmp_path):
+    path = str(tmp_path / 'history.db')
+    # A history written before the stock was recorded
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE changes (upc_id INTEGER NOT NULL, crawl_id INTEGER NOT NULL, price_delta INTEGER, "
+                 "availability_id INTEGER, PRIMARY KEY (upc_id, crawl_id)) WITHOUT ROWID")
+    conn.close()
+    now = datetime.now()
+    record_crawl(crawl({'a': 10.0}).drop(columns=['stock']), path, now - timedelta(days=1))
+    record_crawl(crawl({'a': 10.0}, stock={'a': 3}), path, now)
+
+    conn = connect(path)
+    try:
+        assert list(price_history(conn, 'a')['stock'].fillna(-1)) == [-1, 3]
+    finally:
+        conn.close()
+
+
+def scrape_page(metrics, fail_fetch=False, fail_after=False):
+    """Scrape one page the way data collection.py does, optionally failing"""
+    try:
+        with metrics.time_stage('fetch_listing'):
+            if fail_fetch:
+                raise ConnectionError("page could not be downloaded")
+        if fail_after:
+            raise ValueError("page could not be read")
+        metrics.record_item()
+    except Exception as e:
+        metrics.record_page_failure(e)
+
+
+def test_page_failures_are_counted_once():
+    metrics = CrawlMetrics()
+    scrape_page(metrics)
+    scrape_page(metrics, fail_fetch=True)
+    # A failure outside of the timed stages is counted under 'page'
+    scrape_page(metrics, fail_after=True)
+    metrics.record_failure()
+
+    summary = metrics.summary()
+    assert summary['errors'] == {'fetch_listing': 1, 'page': 1}
+    assert summary['failed_pages'] == 2
+    assert summary['error_rate'] == 0.75
+
+
+def books_database(df):
+    """In-memory database with the cleaned_books table of data processing.py --sqlite"""
+    conn = book_store.connect(':memory:')
+    book_store.write_cleaned_books(conn, df)
+    return conn
+
+
+def test_sql_facet_counts_match_facet_counter():
+    df = make_books(12)
+    # Prices across all the buckets, some of them exactly on a bucket edge
+    df['price'] = np.arange(12) * 6.0 + 4
+    conn = books_database(df)
+    counter = FacetCounter(df)
+    for filters in [('All', None, None, None), ('Poetry', None, None, None), ('All', 10, 40, None),
+                    ('Mystery', None, 50, 2), ('All', None, None, 5), ('Travel', 100, None, None)]:
+        assert book_store.facet_counts(conn, *filters) == counter.counts(*filters)
+
+
+def test_filter_clause():
+    assert book_store.filter_clause() == ("", [])
+    assert book_store.filter_clause('Poetry', 10, 20, 3) == (
+        " WHERE genre = ? AND price >= ? AND price <= ? AND rating_numeric >= ?", ['Poetry', 10, 20, 3])
+    # The facet of a filter is counted without that filter
+    assert book_store.filter_clause('Poetry', 10, 20, 3, skip='price') == (
+        " WHERE genre = ? AND rating_numeric >= ?", ['Poetry', 3])
+    assert book_store.filter_clause('Poetry', None, None, 3, skip='genre') == (" WHERE rating_numeric >= ?", [3])
+
+
+def test_query_books_pages():
+    df = make_books(12)
+    conn = books_database(df)
+    pages = [book_store.query_books(conn, min_rating=2, sort_by='popularity', limit=4, offset=offset)
+             for offset in (0, 4, 8)]
+    matching = df[df['rating_numeric'] >= 2].sort_values('popularity', ascending=False)
+
+    assert [len(page) for page in pages] == [4, 4, 1]
+    assert book_store.count_books(conn, min_rating=2) == 9
+    assert list(pd.concat(pages)['upc']) == list(matching['upc'])
+    # The pages are indexed by database row id (the row of the book in the table, from 1)
+    assert list(pages[0].index) == list(matching.index[:4] + 1)
+    with pytest.raises(ValueError):
+        book_store.query_books(conn, sort_by='title')
+
+
+def test_upsert_books_updates_by_upc():
+    conn = book_store.connect(':memory:')
+    book_store.upsert_books(conn, [{'upc': 'a', 'price': '£10.00'}, {'upc': 'b', 'price': '£20.00'}])
+    # The next crawl finds a new price for b, a new book c and a new field
+    book_store.upsert_books(conn, [{'upc': 'b', 'price': '£18.00', 'stock': 3},
+                                   {'upc': 'c', 'price': '£5.00', 'stock': 1}], batch_size=1)
+
+    books = book_store.read_books(conn).set_index('upc')
+    assert list(books.index) == ['a', 'b', 'c']
+    assert list(books['price']) == ['£10.00', '£18.00', '£5.00']
+    # Books that were not in the new batch keep their values, without the new field
+    assert pd.isna(books.loc['a', 'stock'])
+    assert books.loc['b', 'stock'] == 3
+
+
+def scraped_books():
+    """Books as data collection.py collects them, before enrichment"""
+    return pd.DataFrame({
+        'title': ['A', 'B', 'C', 'D'],
+        'price': ['£10.00', '£20.00', '£30.00', '£40.00'],
+        'rating': ['Five', 'Two', 'Three', 'Seven'],
+        'availability': ['In stock'] * 4,
+        'detail_availability': ['In stock (3 available)', 'In stock (22 available)', 'In stock (20 available)',
+                                'Out of stock'],
+        'page': [1, 1, 2, 3],
+        'position': [1, 2, 1, 20],
+    })
+
+
+def test_parse_stock():
+    stock = book_enrichment.parse_stock(pd.Series(['In stock (22 available)', 'In stock (1 available)',
+                                                   'In stock', None]))
+    assert list(stock) == [22, 1, 0, 0]
+    assert stock.dtype == np.int64
+
+
+def test_enrich_books_ranking():
+    books = scraped_books()
+    assert list(book_enrichment.enrich_books(books)['ranking']) == [1, 2, 21, 60]
+    # Older files without page and position: the order of the rows, unless they have a ranking already
+    books = books.drop(columns=['page', 'position'])
+    assert list(book_enrichment.enrich_books(books)['ranking']) == [1, 2, 3, 4]
+    books['ranking'] = [4, 3, 2, 1]
+    assert list(book_enrichment.enrich_books(books)['ranking']) == [4, 3, 2, 1]
+
+
+def test_default_popularity_matches_the_per_book_formula():
+    books = book_enrichment.enrich_books(scraped_books())
+    assert list(books['stock']) == [3, 22, 20, 0]
+    # The formula the scraper used to compute for each book
+    expected = [rating * 10 + 20 - min(stock, 20) for rating, stock in zip(books['rating_numeric'], books['stock'])]
+    assert list(books['popularity']) == expected == [67, 20, 30, 20]
+    # Without the book page only the listing text is there: no stock count
+    books = book_enrichment.enrich_books(scraped_books().drop(columns=['detail_availability']))
+    assert list(books['stock']) == [0, 0, 0, 0]
+
+
+def test_custom_popularity_formula(tmp_path, monkeypatch):
+    csv_file = str(tmp_path / 'scraped_books.csv')
+    scraped_books().to_csv(csv_file, index=False)
+    monkeypatch.setattr('sys.argv', ['book_enrichment.py', '--csv', csv_file,
+                                     '--popularity', 'rating_numeric * 5 - ranking', '--stock-cap', '5'])
+    book_enrichment.main()
+
+    books = pd.read_csv(csv_file)
+    assert list(books['popularity']) == [24, 8, -6, -60]
+    # The stock cap is a parameter of the formula too
+    assert list(book_enrichment.compute_popularity(books, 'scarcity', stock_cap=5)) == [2, 0, 0, 5]
+